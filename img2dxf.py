@@ -32,6 +32,9 @@ __maintainer__ = "Ilya Razmanov"
 __email__ = "ilyarazmanov@gmail.com"
 __status__ = "Production"
 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
 from tkinter import Label, Tk, filedialog
 
@@ -103,57 +106,42 @@ def img2dxf():
         return None
         # break if user press 'Cancel'
 
-    resultfile = open(resultfilename, 'w')
-    # result file opened
-
-    # Both files opened
-
     # --------------------------------------------------------------
-    # Functions block:
+    # Luminance map block:
     #
-    # src a-la FM style src(x,y,z)
-    # Image should be opened as "imagedata" by main program before
-    # Note that X, Y, Z are not determined in function, you have to determine it in main program
-
-    def src(x, y, z):
-        '''
-        Analog of src from FilterMeister, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        position = (cx * Z) + z  # Here is the main magic of turning two x, z into one array position
-        channelvalue = int((imagedata[cy])[position])
-
-        return channelvalue
-
-    # end of src function
-
-    def srcY(x, y):
-        '''
-        Converting to greyscale, returns Yntensity, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        if info['planes'] < 3:  # supposedly L and LA
-            Yntensity = src(x, y, 0)
-        else:  # supposedly RGB and RGBA
-            Yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
-
-        return Yntensity
-
-    # end of srcY function
-
-    # end of Functions block
+    # Whole image is converted to greyscale once, before building mesh,
+    # so main cycle only reads precomputed values instead of calling src for every channel of every neighbour.
+    # lum[y][x] holds exactly the same Yntensity former srcY(x, Y - 1 - y) used to calculate pixel by pixel.
+
+    # Interleaved pixel rows are split into separate channel planes with stride slices,
+    # so channels are walked in parallel with zip instead of calculating position of every channel of every pixel.
+
+    # Rows are read in reverse order, so the map is Y-mirrored once to mimic Photoshop coordinate system
+    # instead of calculating mirrored row number on every read.
+    # Map rows are kept as compact PyPNG rows or arrays of unsigned short rather than lists of Python ints,
+    # and stay compact while mesh is built: heights are rescaled per distinct value, never per pixel of the whole image.
+
+    if Z == 1:  # supposedly L, the most common heightfield, rows are taken as is
+        lum = list(reversed(imagedata))
+    elif Z == 2:  # supposedly LA, slice of PyPNG row is compact row as well
+        lum = [row[0::Z] for row in reversed(imagedata)]
+    else:  # supposedly RGB and RGBA
+        lum = [array('H', [int(0.2989 * r + 0.587 * g + 0.114 * b) for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])]) for row in reversed(imagedata)]
+
+    # Pyramid corners are shared by four neighbour pixels, so their heights are calculated for the whole image at once.
+    # Edges are repeated once while building instead of clamping coordinates on every read:
+    # edge rows are referenced twice rather than copied, and edge columns are repeated in the row of vertical pair sums.
+    # Then corner[y][x] is the average of the four pixels around the node between pixels (x - 1, y - 1) and (x, y).
+    # Corner heights are multiples of 0.25 not exceeding 65535, so single precision float array holds them exactly at 4 bytes each.
+
+    edged = [lum[0]] + lum + [lum[-1]]
+    corner = []
+    for upper, lower in zip(edged, edged[1:]):
+        pairsum = [a + b for a, b in zip(upper, lower)]
+        pairsum = [pairsum[0]] + pairsum + [pairsum[-1]]
+        corner.append(array('f', [0.25 * (a + b) for a, b in zip(pairsum, pairsum[1:])]))
+
+    # end of Luminance map block
     # --------------------------------------------------------------
 
     # Global positioning and scaling to tweak.
@@ -165,78 +153,128 @@ def img2dxf():
     yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
     zRescale = 1.0 / float(maxcolors)
 
-    # WRITING DXF FILE, finally
-    # Based on specs at: https://images.autodesk.com/adsk/files/autocad_2012_pdf_dxf-reference_enu.pdf
-    resultfile.writelines(
-        [
-            f'999\nGenerated by: {__file__} version: {__version__}\n0\nSECTION\n2\nHEADER\n0\nENDSEC\n0\n',
-            'SECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n5\n0\nLAYER\n2\nPRYANIK\n70\n0\n62\n1\n6\nCONTINUOUS\n0\nENDTAB\n0\nENDSEC\n0\n',
-            'SECTION\n2\nENTITIES\n0\n',
-        ]
-    )
+    # Pyramid vertex coordinates take only three values per pixel along each axis,
+    # so they are calculated and formatted to DXF text once for every column and row instead of for every vertex written.
+    # DXF is pure ASCII, so numbers are formatted straight to bytes, and mesh text never needs encoding.
 
-    # Now going to cycle through image and build mesh
+    xMinus = [b'%f' % (xRescale * (x - 0.5 + xOffset)) for x in range(X)]
+    xCenter = [b'%f' % (xRescale * (x + xOffset)) for x in range(X)]
+    xPlus = [b'%f' % (xRescale * (x + 0.5 + xOffset)) for x in range(X)]
+    yMinus = [b'%f' % (yRescale * (y - 0.5 + yOffset)) for y in range(Y)]
+    yCenter = [b'%f' % (yRescale * (y + yOffset)) for y in range(Y)]
+    yPlus = [b'%f' % (yRescale * (y + 0.5 + yOffset)) for y in range(Y)]
 
-    for y in range(0, Y, 1):
+    # Heights take no more distinct values than there are pixel levels, and usually much less than there are vertices,
+    # so every distinct height is rescaled and formatted once, and vertices only look its text up.
 
-        message = f'Processing row {str(y)} of {str(Y)}...'
-        sortir.deiconify()
-        zanyato.config(text=message)
-        sortir.update()
-        sortir.update_idletasks()
+    zLum = {v: b'%f' % (zOffset + zRescale * v) for v in set(chain.from_iterable(lum))}
+    zCorner = {v: b'%f' % (zOffset + zRescale * v) for v in set(chain.from_iterable(corner))}
 
-        for x in range(0, X, 1):
+    del imagedata, edged  # Source image tuple is not used below, no need to keep it in memory while building mesh
 
-            # Since I was unable to find clear declaration of coordinate system, I'll plug a coordinate switch here
-
-            # Reading switch:
-            xRead = x
-            yRead = Y - 1 - y
-            # 'yRead = Y - y' coordinate mirror to mimic Photoshop coordinate system; +/- 1 steps below are inverted correspondingly vs. original img2mesh
+    # WRITING DXF FILE, finally
+    # Result file is opened as unbuffered binary file, mesh text is built as bytes and written without any buffering layers.
+    # File is closed on leaving the block even if something goes wrong while writing.
 
-            # Remains of Writing switch. No longer used but var names remained so dummy plug must be here.
-            xWrite = x
-            yWrite = y
+    with open(resultfilename, 'wb', buffering=0) as resultfile:
 
-            v9 = srcY(xRead, yRead)  # Current pixel to process and write. Then going to neighbours
-            v1 = 0.25 * (v9 + srcY((xRead - 1), yRead) + srcY((xRead - 1), (yRead + 1)) + srcY(xRead, (yRead + 1)))
-            v3 = 0.25 * (v9 + srcY(xRead, (yRead + 1)) + srcY((xRead + 1), (yRead + 1)) + srcY((xRead + 1), yRead))
-            v5 = 0.25 * (v9 + srcY((xRead + 1), yRead) + srcY((xRead + 1), (yRead - 1)) + srcY(xRead, (yRead - 1)))
-            v7 = 0.25 * (v9 + srcY(xRead, (yRead - 1)) + srcY((xRead - 1), (yRead - 1)) + srcY((xRead - 1), yRead))
+        def dump(chunk):
+            '''
+            Writes bytes to result file, repeating until everything is written
+            '''
+            view = memoryview(chunk)
+            while view:
+                view = view[resultfile.write(view) :]
 
-            # finally going to pyramid building
+        # end of dump function
 
-            # top part begins
-            resultfile.writelines(
+        # Based on specs at: https://images.autodesk.com/adsk/files/autocad_2012_pdf_dxf-reference_enu.pdf
+        dump(
+            ''.join(
                 [
-                    '3DFACE\n8\nPRYANIK\n',  # Opening triangle 2
-                    f'10\n{(xRescale*(xWrite-0.5+xOffset)):f}\n20\n{(yRescale*(yWrite-0.5+yOffset)):f}\n30\n{(zOffset+zRescale*v1):f}\n',
-                    f'11\n{(xRescale*(xWrite+xOffset)):f}\n21\n{(yRescale*(yWrite+yOffset)):f}\n31\n{(zOffset+zRescale*v9):f}\n',
-                    f'12\n{(xRescale*(xWrite+0.5+xOffset)):f}\n22\n{(yRescale*(yWrite-0.5+yOffset)):f}\n32\n{(zOffset+zRescale*v3):f}\n',
-                    '62\n0\n0\n',  # triangle 2
-                    '3DFACE\n8\nPRYANIK\n',  # Opening triangle 4
-                    f'10\n{(xRescale*(xWrite+0.5+xOffset)):f}\n20\n{(yRescale*(yWrite-0.5+yOffset)):f}\n30\n{(zOffset+zRescale*v3):f}\n',
-                    f'11\n{(xRescale*(xWrite+xOffset)):f}\n21\n{(yRescale*(yWrite+yOffset)):f}\n31\n{(zOffset+zRescale*v9):f}\n',
-                    f'12\n{(xRescale*(xWrite+0.5+xOffset)):f}\n22\n{(yRescale*(yWrite+0.5+yOffset)):f}\n32\n{(zOffset+zRescale*v5):f}\n',
-                    '62\n0\n0\n',  # triangle 4
-                    '3DFACE\n8\nPRYANIK\n',  # Opening triangle 6
-                    f'10\n{(xRescale*(xWrite+0.5+xOffset)):f}\n20\n{(yRescale*(yWrite+0.5+yOffset)):f}\n30\n{(zOffset+zRescale*v5):f}\n',
-                    f'11\n{(xRescale*(xWrite+xOffset)):f}\n21\n{(yRescale*(yWrite+yOffset)):f}\n31\n{(zOffset+zRescale*v9):f}\n',
-                    f'12\n{(xRescale*(xWrite-0.5+xOffset)):f}\n22\n{(yRescale*(yWrite+0.5+yOffset)):f}\n32\n{(zOffset+zRescale*v7):f}\n',
-                    '62\n0\n0\n',  # triangle 6
-                    '3DFACE\n8\nPRYANIK\n',  # Opening triangle 8
-                    f'10\n{(xRescale*(xWrite-0.5+xOffset)):f}\n20\n{(yRescale*(yWrite+0.5+yOffset)):f}\n30\n{(zOffset+zRescale*v7):f}\n',
-                    f'11\n{(xRescale*(xWrite+xOffset)):f}\n21\n{(yRescale*(yWrite+yOffset)):f}\n31\n{(zOffset+zRescale*v9):f}\n',
-                    f'12\n{(xRescale*(xWrite-0.5+xOffset)):f}\n22\n{(yRescale*(yWrite-0.5+yOffset)):f}\n32\n{(zOffset+zRescale*v1):f}\n',
-                    '62\n0\n0\n',  # triangle 8
+                    f'999\nGenerated by: {__file__} version: {__version__}\n0\nSECTION\n2\nHEADER\n0\nENDSEC\n0\n',
+                    'SECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n5\n0\nLAYER\n2\nPRYANIK\n70\n0\n62\n1\n6\nCONTINUOUS\n0\nENDTAB\n0\nENDSEC\n0\n',
+                    'SECTION\n2\nENTITIES\n0\n',
                 ]
-            )
-            # top part ends
+            ).encode()
+        )
+
+        # One 3DFACE with all its static group codes is a single template, and pyramid is four of them,
+        # so every pixel is filled with one % operation pasting 36 preformatted numbers in place.
+
+        face = b'3DFACE\n8\nPRYANIK\n10\n%s\n20\n%s\n30\n%s\n11\n%s\n21\n%s\n31\n%s\n12\n%s\n22\n%s\n32\n%s\n62\n0\n0\n'
+        pyramid = face * 4
+
+        # Now going to cycle through image and build mesh.
+        # Rows are processed in strips, each strip is collected into one text and written at once,
+        # and progress is reported once per strip instead of once per row.
+        # Strip height depends on image width so that one strip is about 2048 pixels, i.e. about 1 Mb of DXF text,
+        # keeping the number of writes low for small images without holding huge text in memory for wide ones.
+
+        strip = max(1, 2048 // X)  # Rows per strip
+
+        # Finished strip is written by separate thread while next strip is being formatted.
+        # File output releases GIL while writing to disk, so it overlaps with text building. Single worker keeps strips in order,
+        # and waiting for previous strip before passing next one keeps no more than one strip queued.
+
+        writer = ThreadPoolExecutor(max_workers=1)
+        written = writer.submit(dump, b'')  # Nothing to wait for before the first strip
+
+        try:
+            for ystrip in range(0, Y, strip):
+
+                ystripend = min(ystrip + strip, Y)
+
+                message = f'Processing rows {str(ystrip)}-{str(ystripend - 1)} of {str(Y)}...'
+                sortir.deiconify()
+                zanyato.config(text=message)
+                sortir.update()
+                sortir.update_idletasks()
+
+                striptext = []  # Whole strip of pyramids is collected here and then written at once
+
+                for y in range(ystrip, ystripend, 1):
+
+                    # Rows needed for the whole row of pyramids are fetched once, x cycle below only walks them.
+                    # Maps are already mirrored, so row y of image is row y of maps.
+
+                    lumrow = list(map(zLum.__getitem__, lum[y]))
+                    cornerminus = list(map(zCorner.__getitem__, corner[y]))  # Corners at y - 0.5
+                    cornerplus = list(map(zCorner.__getitem__, corner[y + 1]))  # Corners at y + 0.5
+
+                    y1 = yMinus[y]
+                    y9 = yCenter[y]
+                    y5 = yPlus[y]
+
+                    # Walking columns with zip so neighbour values come in one tuple instead of eight separate indexings
+
+                    for v9, v1, v3, v5, v7, x1, x9, x3 in zip(lumrow, cornerminus, cornerminus[1:], cornerplus[1:], cornerplus, xMinus, xCenter, xPlus):
+                        # v9 is current pixel to process and write, v1, v3, v5, v7 are corners shared with neighbours
+
+                        # finally going to pyramid building
+
+                        # top part begins
+                        striptext.append(
+                            pyramid
+                            % (
+                                x1, y1, v1, x9, y9, v9, x3, y1, v3,  # triangle 2
+                                x3, y1, v3, x9, y9, v9, x3, y5, v5,  # triangle 4
+                                x3, y5, v5, x9, y9, v9, x1, y5, v7,  # triangle 6
+                                x1, y5, v7, x9, y9, v9, x1, y1, v1,  # triangle 8
+                            )
+                        )
+                        # top part ends
+
+                written.result()  # Previous strip written
+                written = writer.submit(dump, b''.join(striptext))  # Strip complete, passing it to writer
+
+            written.result()
+        finally:
+            writer.shutdown()  # Waits for the strip still being written, so output is never closed under the writer
 
-    resultfile.write('ENDSEC\n0\nEOF\n')  # closing object
+        dump(b'ENDSEC\n0\nEOF\n')  # closing object
 
-    # Close output
-    resultfile.close()
+    # Output closed on leaving with block
 
     # --------------------------------------------------------------
     # Destroying dialog
@@ -3,7 +3,7 @@
 '''
 IMG2MESH - Program for conversion of image heightfield to triangle 3D-mesh in different formats
 ------------------------------------------------------------------------------------------------
-Common GUI shell for img2pov, img2obj, img2stl and img2dxf modules.
+Common GUI shell for img2pov, img2obj, img2ply, img2stl, img2stlb and img2dxf modules.
 
 Created by: Ilya Razmanov (mailto:ilyarazmanov@gmail.com)  
             aka Ilyich the Toad (mailto:amphisoft@gmail.com)  
@@ -39,7 +39,9 @@ from pathlib import Path
 
 from img2pov import img2pov
 from img2obj import img2obj
+from img2ply import img2ply
 from img2stl import img2stl
+from img2stlb import img2stlb
 from img2dxf import img2dxf
 
 # ACHTUNG! User break definition below. Take care.
@@ -64,7 +66,7 @@ stopper.title('IMG2MESH')
 if useicon:
     stopper.iconbitmap(iconname)
 stopper.geometry('+200+100')
-stopper.minsize(300, 360)
+stopper.minsize(300, 440)
 stopper.maxsize(500, 500)
 
 preved01 = Label(stopper, text='img2mesh', font=("arial", 36), padx=16, pady=10, justify='center')
@@ -85,6 +87,12 @@ butt03.pack(side=TOP, padx=4, pady=2, fill=X)
 butt04 = Button(stopper, text='PNG to DXF...', font=('arial', 16), cursor='hand2', justify='center', command=img2dxf)
 butt04.pack(side=TOP, padx=4, pady=2, fill=X)
 
+butt05 = Button(stopper, text='PNG to PLY...', font=('arial', 16), cursor='hand2', justify='center', command=img2ply)
+butt05.pack(side=TOP, padx=4, pady=2, fill=X)
+
+butt06 = Button(stopper, text='PNG to binary STL...', font=('arial', 16), cursor='hand2', justify='center', command=img2stlb)
+butt06.pack(side=TOP, padx=4, pady=2, fill=X)
+
 butt09 = Button(stopper, text='Exit', font=('arial', 16), cursor='hand2', justify='center', command=DyeDyeMyDarling)
 butt09.pack(side=BOTTOM, padx=4, pady=(8, 2), fill=X)
 
@@ -12,6 +12,7 @@ History:
 1.0.1.0     Program converted into self-calling function to have a possibility to import it.  
 1.9.1.0     Multiple changes everywhere lead to whole product update. Versioning changed to MAINVERSION.MONTH since Jan 2024.DAY.subversion  
 1.13.3.0    Maintenance update, minor code cleanup.  
+1.34.16.0   Vertices shared by neighbour triangles and written once, faces refer to them by absolute numbers. File is about 4 times smaller.  
 
 -------------------
 Main site:
@@ -27,11 +28,14 @@ __author__ = "Ilya Razmanov"
 __copyright__ = "(c) 2024 Ilya Razmanov"
 __credits__ = "Ilya Razmanov"
 __license__ = "unlicense"
-__version__ = "1.13.3.0"
+__version__ = "1.34.16.0"
 __maintainer__ = "Ilya Razmanov"
 __email__ = "ilyarazmanov@gmail.com"
 __status__ = "Production"
 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, repeat
 from pathlib import Path
 from tkinter import Label, Tk, filedialog
 
@@ -103,57 +107,42 @@ def img2obj():
         return None
         # break if user press 'Cancel'
 
-    resultfile = open(resultfilename, 'w')
-    # result file opened
-
-    # Both files opened
-
     # --------------------------------------------------------------
-    # Functions block:
+    # Luminance map block:
     #
-    # src a-la FM style src(x,y,z)
-    # Image should be opened as "imagedata" by main program before
-    # Note that X, Y, Z are not determined in function, you have to determine it in main program
-
-    def src(x, y, z):
-        '''
-        Analog of src from FilterMeister, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        position = (cx * Z) + z  # Here is the main magic of turning two x, z into one array position
-        channelvalue = int((imagedata[cy])[position])
-
-        return channelvalue
-
-    # end of src function
-
-    def srcY(x, y):
-        '''
-        Converting to greyscale, returns Yntensity, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        if info['planes'] < 3:  # supposedly L and LA
-            Yntensity = src(x, y, 0)
-        else:  # supposedly RGB and RGBA
-            Yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
-
-        return Yntensity
-
-    # end of srcY function
-
-    # end of Functions block
+    # Whole image is converted to greyscale once, before building mesh,
+    # so main cycle only reads precomputed values instead of calling src for every channel of every neighbour.
+    # Rows are read in reverse order, so the map is Y-mirrored once to mimic Photoshop coordinate system
+    # instead of calculating mirrored row number on every read.
+
+    # Instead of calculating position of every channel of every pixel, rows are split into channel planes
+    # with stride slices, and channels are walked in parallel with zip.
+
+    # Map rows are kept as compact PyPNG rows or typed arrays rather than lists of Python ints.
+
+    if Z == 1:  # supposedly L, rows are taken as is
+        lum = list(reversed(imagedata))
+    elif Z == 2:  # supposedly LA, slice of PyPNG row is compact row as well
+        lum = [row[0::Z] for row in reversed(imagedata)]
+    else:  # supposedly RGB and RGBA
+        lum = [array('H', [int(0.2989 * r + 0.587 * g + 0.114 * b) for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])]) for row in reversed(imagedata)]
+
+    # Pyramid corners are shared by four neighbour pixels, so their heights are calculated for the whole image at once.
+    # Edges are repeated once while building instead of clamping coordinates on every read:
+    # edge rows are referenced twice rather than copied, and edge columns are repeated in the row of vertical pair sums.
+    # Then corner[y][x] is the sum of the four pixels around the node between pixels (x - 1, y - 1) and (x, y),
+    # kept as integer to be averaged when formatted below. Sums do not exceed 4 * 65535, so they are stored as unsigned long arrays.
+
+    edged = [lum[0]] + lum + [lum[-1]]
+    corner = []
+    for upper, lower in zip(edged, edged[1:]):
+        pairsum = [a + b for a, b in zip(upper, lower)]
+        pairsum = [pairsum[0]] + pairsum + [pairsum[-1]]
+        corner.append(array('L', [a + b for a, b in zip(pairsum, pairsum[1:])]))
+
+    del imagedata, edged  # Source image tuple is not needed anymore, maps above keep only rows they use
+
+    # end of Luminance map block
     # --------------------------------------------------------------
 
     # Global positioning and scaling to tweak.
@@ -165,68 +154,136 @@ def img2obj():
     yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
     zRescale = 1.0 / float(maxcolors)
 
+    # Vertex coordinates are calculated and formatted to text once for every column and row of corner nodes and pixel centers,
+    # so vertex template only pastes ready texts and never formats floats itself.
+    # OBJ mesh is pure ASCII, so numbers are formatted straight to bytes, and mesh text never needs encoding.
+
+    xNode = [b'%.7g' % (xRescale * (i - 0.5 + xOffset)) for i in range(X + 1)]
+    yNode = [b'%.7g' % (yRescale * (j - 0.5 + yOffset)) for j in range(Y + 1)]
+    xCenter = [b'%.7g' % (xRescale * (x + xOffset)) for x in range(X)]
+    yCenter = [b'%.7g' % (yRescale * (y + yOffset)) for y in range(Y)]
+
+    # Heights take a limited number of distinct values, integer pixel values for centers and quarters of integer sums for corners,
+    # and real images repeat them a lot. So every distinct height present is formatted to text once,
+    # and vertex rows only look texts up.
+
+    zCenterText = {v: b'%.7g' % (zOffset + zRescale * v) for v in set(chain.from_iterable(lum))}
+    zCornerText = {v: b'%.7g' % (zOffset + zRescale * (0.25 * v)) for v in set(chain.from_iterable(corner))}
+
     # 	WRITING OBJ FILE, finally
-    resultfile.write(f'# Generated by: {__file__} version: {__version__}\n')  # opening object
-    resultfile.write('o pryanik_nepechatnyj\n')  # opening object
+    # Result file is opened as unbuffered binary file, mesh text is built as bytes and written without any buffering layers.
+    # File is closed on leaving the block even if something goes wrong while writing.
+
+    with open(resultfilename, 'wb', buffering=0) as resultfile:
+
+        def dump(chunk):
+            '''
+            Writes bytes to result file, repeating until everything is written
+            '''
+            view = memoryview(chunk)
+            while view:
+                view = view[resultfile.write(view) :]
+
+        # end of dump function
+
+        dump(
+            ''.join(
+                [
+                    f'# Generated by: {__file__} version: {__version__}\n',
+                    'o pryanik_nepechatnyj\n',  # opening object
+                ]
+            ).encode()
+        )
+
+        # Mesh vertices are shared instead of being repeated for every triangle:
+        # every corner node is written once and referenced by all triangles around it,
+        # and every pixel center is written once and referenced by four triangles of its pyramid.
+        # Vertices are numbered from 1 in the order they are written: corner nodes row by row first,
+        # (X + 1) * (Y + 1) of them, then pixel centers, X * Y of them, interleaved with faces using them.
+        # %.7g keeps the same 7 significant digits former :e format gave, but without exponent and trailing zeros.
+
+        vertex = b'v %s %s %s\n'
+        pyramid = b'f %d %d %d\nf %d %d %d\nf %d %d %d\nf %d %d %d\n'  # Triangles 2, 4, 6, 8
+
+        centerbase = (X + 1) * (Y + 1) + 1  # Number of first pixel center vertex
 
-    # Now going to cycle through image and build mesh
+        # Rows are processed in strips, each strip is collected into one text and written at once.
+        # Strip height depends on image width so that one strip is about 2048 pixels, i.e. about 0.25 Mb of OBJ text,
+        # keeping the number of writes low for small images without holding huge text in memory for wide ones.
 
-    for y in range(0, Y, 1):
+        strip = max(1, 2048 // X)  # Rows per strip
+
+        # Corner nodes first
 
-        message = f'Processing row {str(y)} of {str(Y)}...'
         sortir.deiconify()
-        zanyato.config(text=message)
+        zanyato.config(text='Writing corner vertices...')
         sortir.update()
         sortir.update_idletasks()
 
-        for x in range(0, X, 1):
+        # Vertex rows are kept as separate coordinate columns, and vertex template is mapped over their zip,
+        # so the whole row is formatted without Python level cycle.
 
-            # Since I was unable to find clear declaration of coordinate system, I'll plug a coordinate switch here
+        for jstrip in range(0, Y + 1, strip):
+            striptext = []
+            for y1, heights in zip(yNode[jstrip : jstrip + strip], corner[jstrip : jstrip + strip]):
+                striptext.extend(map(vertex.__mod__, zip(xNode, repeat(y1), map(zCornerText.__getitem__, heights))))
+            dump(b''.join(striptext))
 
-            # Reading switch:
-            xRead = x
-            yRead = Y - 1 - y
-            # 'yRead = Y - y' coordinate mirror to mimic Photoshop coordinate system; +/- 1 steps below are inverted correspondingly vs. original img2mesh
+        # Now going to cycle through image and build mesh.
+        # Progress is reported once per strip instead of once per row.
 
-            # Remains of Writing switch. No longer used since v. 0.1.0.2 but var names remained so dummy plug must be here.
-            xWrite = x
-            yWrite = y
+        # Finished strip is written by separate thread while next strip is being formatted.
+        # File output releases GIL while writing to disk, so it overlaps with text building. Single worker keeps strips in order,
+        # and waiting for previous strip before passing next one keeps no more than one strip queued.
 
-            v9 = srcY(xRead, yRead)  # Current pixel to process and write. Then going to neighbours
-            v1 = 0.25 * (v9 + srcY((xRead - 1), yRead) + srcY((xRead - 1), (yRead + 1)) + srcY(xRead, (yRead + 1)))
-            v3 = 0.25 * (v9 + srcY(xRead, (yRead + 1)) + srcY((xRead + 1), (yRead + 1)) + srcY((xRead + 1), yRead))
-            v5 = 0.25 * (v9 + srcY((xRead + 1), yRead) + srcY((xRead + 1), (yRead - 1)) + srcY(xRead, (yRead - 1)))
-            v7 = 0.25 * (v9 + srcY(xRead, (yRead - 1)) + srcY((xRead - 1), (yRead - 1)) + srcY((xRead - 1), yRead))
+        writer = ThreadPoolExecutor(max_workers=1)
+        written = writer.submit(dump, b'')  # Nothing to wait for before the first strip
 
-            # finally going to pyramid building
+        try:
+            for ystrip in range(0, Y, strip):
 
-            # top part begins
-            resultfile.writelines(
-                [
-                    f'v {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                    f'v {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'v {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                    'f -3 -2 -1\n',  # triangle 2
-                    f'v {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                    f'v {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'v {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                    'f -3 -2 -1\n',  # triangle 4
-                    f'v {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                    f'v {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'v {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                    'f -3 -2 -1\n',  # triangle 6
-                    f'v {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                    f'v {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'v {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                    'f -3 -2 -1\n',  # triangle 8
-                ]
-            )
-            # top part ends
+                ystripend = min(ystrip + strip, Y)
+
+                message = f'Processing rows {str(ystrip)}-{str(ystripend - 1)} of {str(Y)}...'
+                sortir.deiconify()
+                zanyato.config(text=message)
+                sortir.update()
+                sortir.update_idletasks()
+
+                striptext = []  # Whole strip of pyramids is collected here and then written at once
+
+                for y in range(ystrip, ystripend, 1):
+
+                    # Y mirror to mimic Photoshop coordinate system is already applied to lum map, so rows are written as they are.
+
+                    # Pixel centers of the row
+
+                    striptext.extend(map(vertex.__mod__, zip(xCenter, repeat(yCenter[y]), map(zCenterText.__getitem__, lum[y]))))
+
+                    # Pyramids of the row, made of corner nodes of rows y and y + 1 and pixel centers written above.
+                    # Vertex numbers only step by 1 along the row, so every vertex of pyramid is a range over the row,
+                    # and the pyramid template is mapped over their zip the same way as vertices.
+
+                    n1 = range(1 + y * (X + 1), 1 + y * (X + 1) + X)  # Corners at x - 0.5, y - 0.5
+                    n3 = range(n1.start + 1, n1.stop + 1)  # Corners at x + 0.5, y - 0.5
+                    n7 = range(n1.start + X + 1, n1.stop + X + 1)  # Corners at x - 0.5, y + 0.5
+                    n5 = range(n7.start + 1, n7.stop + 1)  # Corners at x + 0.5, y + 0.5
+                    n9 = range(centerbase + y * X, centerbase + y * X + X)  # Pixel centers
+
+                    # finally going to pyramid building
+
+                    striptext.extend(map(pyramid.__mod__, zip(n1, n9, n3, n3, n9, n5, n5, n9, n7, n7, n9, n1)))
+
+                written.result()  # Previous strip written
+                written = writer.submit(dump, b''.join(striptext))  # Strip complete, passing it to writer
+
+            written.result()
+        finally:
+            writer.shutdown()  # Waits for the strip still being written, so output is never closed under the writer
 
-    resultfile.write('# end pryanik_nepechatnyj')  # closing object
+        dump(b'# end pryanik_nepechatnyj')  # closing object
 
-    # Close output
-    resultfile.close()
+    # Output closed on leaving with block
 
     # --------------------------------------------------------------
     # Destroying dialog
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+'''
+IMG2PLY - Program for conversion of image heightfield to triangle mesh in binary PLY format
+-----------------------------------------------------------------------------------------
+
+Created by: Ilya Razmanov (mailto:ilyarazmanov@gmail.com)  
+            aka Ilyich the Toad (mailto:amphisoft@gmail.com)  
+History:
+
+1.34.16.0   First production release. Same mesh as img2obj, written as binary little endian PLY, no text formatting at all.  
+
+-------------------
+Main site:
+https://dnyarri.github.io  
+
+Project mirrored at:  
+https://github.com/Dnyarri/img2mesh  
+https://gitflic.ru/project/dnyarri/img2mesh  
+
+'''
+
+__author__ = "Ilya Razmanov"
+__copyright__ = "(c) 2024-2026 Ilya Razmanov"
+__credits__ = "Ilya Razmanov"
+__license__ = "unlicense"
+__version__ = "1.34.16.0"
+__maintainer__ = "Ilya Razmanov"
+__email__ = "ilyarazmanov@gmail.com"
+__status__ = "Production"
+
+from array import array
+from itertools import chain, repeat, starmap
+from pathlib import Path
+from struct import Struct
+from sys import byteorder
+from tkinter import Label, Tk, filedialog
+
+from png import Reader  # I/O with PyPNG from: https://gitlab.com/drj11/pypng
+
+# ACHTUNG! Starting a whole-program procedure!
+
+
+def img2ply():
+    '''
+    Procedure for opening PNG heightfield and creating binary .ply 3D mesh file from it.
+
+    '''
+
+    # --------------------------------------------------------------
+    # Creating dialog
+
+    iconpath = Path(__file__).resolve().parent / 'vaba.ico'
+    iconname = str(iconpath)
+    useicon = iconpath.exists()  # Check if icon file really exist. If False, it will not be used later.
+
+    sortir = Tk()
+    sortir.title('PNG to PLY conversion')
+    if useicon:
+        sortir.iconbitmap(iconname)  # Replacement for simple sortir.iconbitmap('name.ico') - ugly but stable.
+    sortir.geometry('+200+100')
+    zanyato = Label(sortir, text='Allons-y!', font=('Courier', 14), padx=16, pady=10, justify='center')
+    zanyato.pack()
+    sortir.withdraw()
+
+    # Main dialog created and hidden
+    # --------------------------------------------------------------
+
+    # Open source image
+    sourcefilename = filedialog.askopenfilename(title='Open source PNG file', filetypes=[('PNG', '.png')], defaultextension=('PNG', '.png'))
+    # Source file name taken
+
+    if (sourcefilename == '') or (sourcefilename is None):
+        return None
+        # break if user press 'Cancel'
+
+    source = Reader(filename=sourcefilename)
+    # opening file with PyPNG
+
+    X, Y, pixels, info = source.asDirect()
+    # Opening image, iDAT comes to "pixels" generator, to be tuple'd later
+
+    Z = info['planes']  # Maximum channel number
+    imagedata = tuple(pixels)  # Building tuple from generator
+
+    if info['bitdepth'] == 8:
+        maxcolors = 255  # Maximal value for 8-bit channel
+    if info['bitdepth'] == 16:
+        maxcolors = 65535  # Maximal value for 16-bit channel
+
+    # source file opened, initial data received
+
+    # opening result file, first get name
+    resultfilename = filedialog.asksaveasfilename(
+        title='Save binary PLY file',
+        filetypes=[
+            ('Stanford PLY file', '*.ply'),
+            ('All Files', '*.*'),
+        ],
+        defaultextension=('Stanford PLY file', '.ply'),
+    )
+
+    if (resultfilename == '') or (resultfilename is None):
+        return None
+        # break if user press 'Cancel'
+
+    resultfile = open(resultfilename, 'wb', buffering=1 << 20)
+    # result file opened as binary with 1 Mb buffer
+
+    # Both files opened
+
+    # --------------------------------------------------------------
+    # Luminance map block, same as in img2obj:
+    #
+    # Whole image is converted to greyscale once, Y-mirrored to mimic Photoshop coordinate system,
+    # and kept as compact PyPNG rows or typed arrays.
+
+    if Z == 1:  # supposedly L, rows are taken as is
+        lum = list(reversed(imagedata))
+    elif Z == 2:  # supposedly LA, slice of PyPNG row is compact row as well
+        lum = [row[0::Z] for row in reversed(imagedata)]
+    else:  # supposedly RGB and RGBA
+        lum = [array('H', [int(0.2989 * r + 0.587 * g + 0.114 * b) for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])]) for row in reversed(imagedata)]
+
+    # corner[y][x] is the sum of the four pixels around the node between pixels (x - 1, y - 1) and (x, y),
+    # with edge rows and columns repeated, to be averaged when rescaled below.
+
+    edged = [lum[0]] + lum + [lum[-1]]
+    corner = []
+    for upper, lower in zip(edged, edged[1:]):
+        pairsum = [a + b for a, b in zip(upper, lower)]
+        pairsum = [pairsum[0]] + pairsum + [pairsum[-1]]
+        corner.append(array('L', [a + b for a, b in zip(pairsum, pairsum[1:])]))
+
+    del imagedata, edged  # Source image tuple is not needed anymore, maps above keep only rows they use
+
+    # end of Luminance map block
+    # --------------------------------------------------------------
+
+    # Global positioning and scaling to tweak.
+
+    xOffset = -0.5 * float(X - 1)  # To be added BEFORE rescaling to center object.
+    yOffset = -0.5 * float(Y - 1)  # To be added BEFORE rescaling to center object
+    zOffset = 0.0
+
+    yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
+    zRescale = 1.0 / float(maxcolors)
+
+    # Vertex coordinates are calculated once for every column and row of corner nodes and pixel centers,
+    # and every distinct height present is rescaled once.
+
+    xNode = [xRescale * (i - 0.5 + xOffset) for i in range(X + 1)]
+    yNode = [yRescale * (j - 0.5 + yOffset) for j in range(Y + 1)]
+    xCenter = [xRescale * (x + xOffset) for x in range(X)]
+    yCenter = [yRescale * (y + yOffset) for y in range(Y)]
+
+    zCenter = {v: zOffset + zRescale * v for v in set(chain.from_iterable(lum))}
+    zCorner = {v: zOffset + zRescale * (0.25 * v) for v in set(chain.from_iterable(corner))}
+
+    # WRITING PLY FILE, finally
+    # Based on specs at: https://paulbourke.net/dataformats/ply/
+    # Vertices are shared the same way as in img2obj: corner nodes row by row, (X + 1) * (Y + 1) of them,
+    # then pixel centers, X * Y of them. PLY wants all vertices before faces, and numbers them from 0.
+
+    resultfile.write(
+        ''.join(
+            [
+                'ply\n',
+                'format binary_little_endian 1.0\n',
+                f'comment Generated by: {__file__} version: {__version__}\n',
+                f'element vertex {(X + 1) * (Y + 1) + X * Y}\n',
+                'property float x\n',
+                'property float y\n',
+                'property float z\n',
+                f'element face {4 * X * Y}\n',
+                'property list uchar int vertex_indices\n',
+                'end_header\n',
+            ]
+        ).encode()
+    )
+
+    # Vertex rows are collected as flat single precision float arrays x, y, z, x, y, z...
+    # and written as raw bytes, so no number is ever converted to text.
+    # array keeps native byte order, so it is swapped on big endian machines only.
+
+    swap = byteorder == 'big'
+
+    def vertexrow(xrow, y, heights):
+        '''
+        Returns one row of vertices as little endian float32 bytes
+        '''
+        row = array('f', chain.from_iterable(zip(xrow, repeat(y), heights)))
+        if swap:
+            row.byteswap()
+        return row.tobytes()
+
+    # end of vertexrow function
+
+    # Every face record is count byte 3 followed by three int32 indices, so the pyramid of four triangles
+    # is one precompiled little endian struct, packed with 16 values at once.
+
+    pyramid = Struct('<' + 'B3i' * 4)  # Triangles 2, 4, 6, 8
+
+    centerbase = (X + 1) * (Y + 1)  # Number of first pixel center vertex
+
+    # Rows are processed in strips, each strip is collected and written at once,
+    # and progress is reported once per strip instead of once per row.
+
+    strip = max(1, 2048 // X)  # Rows per strip
+
+    sortir.deiconify()
+    zanyato.config(text='Writing vertices...')
+    sortir.update()
+    sortir.update_idletasks()
+
+    for jstrip in range(0, Y + 1, strip):
+        resultfile.write(b''.join([vertexrow(xNode, y1, map(zCorner.__getitem__, heights)) for y1, heights in zip(yNode[jstrip : jstrip + strip], corner[jstrip : jstrip + strip])]))
+
+    for ystrip in range(0, Y, strip):
+        resultfile.write(b''.join([vertexrow(xCenter, y9, map(zCenter.__getitem__, lumrow)) for y9, lumrow in zip(yCenter[ystrip : ystrip + strip], lum[ystrip : ystrip + strip])]))
+
+    del lum, corner  # Vertices written, only indices are left
+
+    three = repeat(3)  # Number of vertices in every face
+
+    for ystrip in range(0, Y, strip):
+
+        ystripend = min(ystrip + strip, Y)
+
+        message = f'Processing rows {str(ystrip)}-{str(ystripend - 1)} of {str(Y)}...'
+        sortir.deiconify()
+        zanyato.config(text=message)
+        sortir.update()
+        sortir.update_idletasks()
+
+        stripdata = []  # Whole strip of pyramids is collected here and then written at once
+
+        for y in range(ystrip, ystripend, 1):
+
+            # Vertex numbers only step by 1 along the row, so every vertex of pyramid is a range over the row
+
+            n1 = range(y * (X + 1), y * (X + 1) + X)  # Corners at x - 0.5, y - 0.5
+            n3 = range(n1.start + 1, n1.stop + 1)  # Corners at x + 0.5, y - 0.5
+            n7 = range(n1.start + X + 1, n1.stop + X + 1)  # Corners at x - 0.5, y + 0.5
+            n5 = range(n7.start + 1, n7.stop + 1)  # Corners at x + 0.5, y + 0.5
+            n9 = range(centerbase + y * X, centerbase + y * X + X)  # Pixel centers
+
+            stripdata.extend(starmap(pyramid.pack, zip(three, n1, n9, n3, three, n3, n9, n5, three, n5, n9, n7, three, n7, n9, n1)))
+
+        resultfile.write(b''.join(stripdata))
+
+    # Close output
+    resultfile.close()
+
+    # --------------------------------------------------------------
+    # Destroying dialog
+
+    sortir.destroy()
+    sortir.mainloop()
+
+    # Dialog destroyed and closed
+    # --------------------------------------------------------------
+
+
+# Procedure ended, the program begins
+if __name__ == "__main__":
+    img2ply()
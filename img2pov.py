@@ -20,6 +20,7 @@ History:
 2.8.3.0     Everything rewritten to fully match Photoshop coordinate system. Important changes in camera, handle with care!  
 2.9.1.0     POV export changed, light and textures improved, whole product update. Versioning changed to MAINVERSION.MONTH since Jan 2024.DAY.subversion  
 2.13.4.0    Exported file may be used both as scene and as include.  
+2.34.16.0   Mesh exported as mesh2 with shared vertices and triangles referring to them by number. Flat pixels written as two triangles instead of four.  
 
 -------------------
 Main site:
@@ -35,11 +36,14 @@ __author__ = "Ilya Razmanov"
 __copyright__ = "(c) 2023-2024 Ilya Razmanov"
 __credits__ = "Ilya Razmanov"
 __license__ = "unlicense"
-__version__ = "2.13.4.0"
+__version__ = "2.34.16.0"
 __maintainer__ = "Ilya Razmanov"
 __email__ = "ilyarazmanov@gmail.com"
 __status__ = "Production"
 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, repeat
 from pathlib import Path
 from time import ctime, time
 from tkinter import Label, Tk, filedialog
@@ -112,260 +116,389 @@ def img2pov():
         return None
         # break if user press 'Cancel'
 
-    resultfile = open(resultfilename, 'w')
-    # result file opened
-
-    # Both files opened
+    # Source file opened, result file name taken
 
     # --------------------------------------------------------------
-    # Functions block:
+    # Luminance map block:
     #
-    # src a-la FM style src(x,y,z)
-    # Image should be opened as "imagedata" by main program before
-    # Note that X, Y, Z are not determined in function, you have to determine it in main program
-
-    def src(x, y, z):
-        '''
-        Analog src from FM, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        position = (cx * Z) + z  # Here is the main magic of turning two x, z into one array position
-        channelvalue = int((imagedata[cy])[position])
-
-        return channelvalue
-
-    # end of src function
-
-    def srcY(x, y):
-        '''
-        Converting to greyscale, returns Yntensity, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        if info['planes'] < 3:  # supposedly L and LA
-            Yntensity = src(x, y, 0)
-        else:  # supposedly RGB and RGBA
-            Yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
-
-        return Yntensity
-
-    # end of srcY function
-
-    # 	WRITING POV FILE
-
-    seconds = time()
-    localtime = ctime(seconds)  # will be used for debug info
-
-    # ------------
-    #  POV header
-    # ---
-
-    resultfile.writelines(
-        [
-            '/*\n',
-            'Persistence of Vision Ray Tracer Scene Description File\n',
-            'Version: 3.7\n',
-            'Description: A triangle mesh scene file converted from PNG image heightfield.\n',
-            '   Coordinate system mimic Photoshop, i.e. the origin is top left corner.\n',
-            '   Z axis points toward viewer.\n\n',
-            'IMPORTANT:\n',
-            '   File may be directly used as include, if the main file contain the following:\n\n',
-            '       #declare Main = 1;\n',
-            '       #include "filename.inc"\n',
-            '       object {thething}\n\n',
-            '   "Main" variable turns off camera etc in include, allowing main file to work.\n\n',
-            'Author: Automatically generated by img2mesh program\n',
-            '   https://github.com/Dnyarri/img2mesh\n',
-            '   https://gitflic.ru/project/dnyarri/img2mesh\n',
-            'developed by Ilya Razmanov aka Ilyich the Toad\n',
-            '   https://dnyarri.github.io\n',
-            '   mailto:ilyarazmanov@gmail.com\n\n',
-            f'Generated by: {__file__} version: {__version__} at: {localtime}\n'
-            f'Converted from: {sourcefilename}\n'
-            f'Source info: {info}\n'
-            '*/\n\n',
-        ]
-    )
-
-    #  Statements
-
-    resultfile.writelines(
-        [
-            '\n',
-            '#version 3.7;\n\n',
-            '#ifndef (Main)  // Include check 1\n\n',
-            '  global_settings{\n',
-            '    max_trace_level 3   // Set low to speed up rendering. May need to be increased for metals and glasses\n',
-            '    adc_bailout 0.01    // Set high to speed up rendering. May need to be decreased to 1/256 for better quality\n',
-            '    ambient_light <0.5, 0.5, 0.5>\n',
-            '    assumed_gamma 1.0\n  }\n\n',
-            '  #include "colors.inc"\n',
-            '  #include "finish.inc"\n',
-            '  #include "metals.inc"\n',
-            '  #include "golds.inc"\n\n',
-            '#end  // End check 1\n\n',
-            '\n/*    Map function\nMaps are transfer functions z value is passed through.\nResult is similar to Photoshop or GIMP "Curves" applied to source heightfield PNG,\nbut here map is nondestructively applied to mesh within POVRay.\nBy default exported map is five points linear spline, corresponding to straight line\ndescribing "identical" transform, i.e. input = output.\nYou can both edit existing control points and add new ones. Note that points order is irrelevant\nsince POVRay will resort vectors according to entry value (first digits in the row before comma),\nso you can add middle points at the end of the list below or write the whole list upside down. */\n\n',
-            '#ifndef (Curve)\n',
-            '  #declare Curve = function {  // Spline curve construction begins\n',
-            '    spline { linear_spline\n',
-            '      0.0,   <0.0,   0>\n',
-            '      0.25,  <0.25,  0>\n',
-            '      0.5,   <0.5,   0>\n',
-            '      0.75,  <0.75,  0>\n',
-            '      1.0,   <1.0,   0>}\n    }  // Construction complete\n',
-            '#end\n',
-            '#ifndef (map) #declare map = function(c) {Curve(c).u}; #end  // Spline curve assigned as map\n',
-        ]
-    )
-
-    # Camera and light
-
-    resultfile.writelines(
-        [
-            '\n#ifndef (Main)  // Include check 2\n\n',
-            '/*  Camera\n\n',
-            'Coordinate system for the whole scene match Photoshop\n',
-            'Origin is top left, z points at you */\n\n',
-            '#declare camera_position = <0.0, 0.0, 3.0>;  // Camera position over object, used for angle\n\n',
-            'camera {\n',
-            '  // orthographic\n',
-            '  location camera_position\n',
-            '  right x*image_width/image_height\n',
-            '  up y\n',
-            '  sky <0, -1, 0>\n',
-            '  direction <0, 0, vlength(camera_position - <0.0, 0.0, 1.0>)>  // May alone work for many objects. Otherwise fiddle with angle below\n',
-            f'//  angle 2.0*(degrees(atan2({0.5 * max(X,Y)/X}, vlength(camera_position - <0.0, 0.0, 1.0>)))) // Supposed to fit object\n',
-            '  look_at<0.0, 0.0, 0.5>\n',
-            '}\n\n',
-            'light_source {0*x\n',
-            '    color rgb <1.0, 1.0, 1.0>\n',
-            '//    area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n',
-            '    translate <-5, -5, 5>\n',
-            '}\n',
-            '\n//  Layered thething texture\n',
-            '#declare thething_texture_bottom =    // Smooth z gradient\n',
-            '  texture {\n',
-            '    pigment {\n',
-            '    gradient z\n',
-            '      colour_map {\n',
-            '        [0.0, rgb <1, 0, 0>]\n',
-            '        [0.5, rgb <0, 0, 1>]\n',
-            '        [1.0, rgb <1, 1, 1>]\n',
-            '      }\n',
-            '    }\n',
-            '    finish {phong 1.0}\n',
-            '  }\n\n',
-            '#declare thething_texture_top =       // Sharp horizontals overlay\n',
-            '  #declare line_width = 0.01;\n',
-            '  texture {\n',
-            '    pigment {\n',
-            '    gradient z\n',
-            '      colour_map {\n',
-            '        [0.0, rgbt <0,0,0,1>]\n',
-            '        [0.5 - line_width, rgbt <0,0,0,1>]\n',
-            '        [0.5 - line_width, rgbt <0,0,0,0>]\n',
-            '        [0.5, rgbt <0,0,0,0>]\n',
-            '        [0.5 + line_width, rgbt <0,0,0,0>]\n',
-            '        [0.5 + line_width, rgbt <0,0,0,1>]\n',
-            '        [1.0, rgbt <0,0,0,1>]\n',
-            '      }\n',
-            '    }\n',
-            '    scale 0.1\n',
-            '  }\n\n',
-            '#declare thething_texture =           // Overall texture used in the end\n',
-            '    texture {thething_texture_bottom}\n',
-            '    texture {thething_texture_top}\n',
-            '\n\n#end // End check 2\n',
-            '\n\n// Main mesh "thething" begins. NOW!\n',
+    # Whole image is converted to greyscale once, before building mesh,
+    # so main cycle only reads precomputed values instead of calling src for every channel of every neighbour.
+    # lum[y][x] holds exactly the same Yntensity former srcY(x, y) used to calculate pixel by pixel.
+
+    # Channel count is checked once for the whole image, and interleaved pixel rows are split into separate channel planes
+    # with stride slices, so channels are walked in parallel with zip instead of calculating position of every channel of every pixel.
+
+    # Map rows are kept as compact PyPNG rows or arrays of unsigned short rather than lists of Python ints.
+
+    if Z == 1:  # supposedly L, the most common heightfield, rows are taken as is
+        lum = list(imagedata)
+    elif Z == 2:  # supposedly LA, slice of PyPNG row is compact row as well
+        lum = [row[0::Z] for row in imagedata]
+    else:  # supposedly RGB and RGBA
+        # Channel weights are multiplied by every possible channel value once, so pixels only look weighted values up
+        # and add them in the same order, giving exactly the same Yntensity without three multiplications per pixel.
+        weightR = [0.2989 * v for v in range(maxcolors + 1)]
+        weightG = [0.587 * v for v in range(maxcolors + 1)]
+        weightB = [0.114 * v for v in range(maxcolors + 1)]
+        lum = [
+            array('H', [int(r + g + b) for r, g, b in zip(map(weightR.__getitem__, row[0::Z]), map(weightG.__getitem__, row[1::Z]), map(weightB.__getitem__, row[2::Z]))])
+            for row in imagedata
         ]
-    )
-
-    # Mesh
 
-    # Global positioning and scaling to tweak.
+    # Pyramid corners are shared by four neighbour pixels, so their heights are calculated for the whole image at once.
+    # Edges are repeated once while building instead of clamping coordinates on every read:
+    # edge rows are referenced twice rather than copied, and edge columns are repeated in the row of vertical pair sums.
+    # Then corner[y][x] is the average of the four pixels around the node between pixels (x - 1, y - 1) and (x, y).
+    # Corner heights are multiples of 0.25 not exceeding 65535, so single precision float array holds them exactly at 4 bytes each.
 
-    xOffset = -0.5 * float(X - 1)  # To be added BEFORE rescaling to center object.
-    yOffset = -0.5 * float(Y - 1)  # To be added BEFORE rescaling to center object
+    edged = [lum[0]] + lum + [lum[-1]]
+    corner = []
+    for upper, lower in zip(edged, edged[1:]):
+        pairsum = [a + b for a, b in zip(upper, lower)]
+        pairsum = [pairsum[0]] + pairsum + [pairsum[-1]]
+        corner.append(array('f', [0.25 * (a + b) for a, b in zip(pairsum, pairsum[1:])]))
 
-    yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
-    zRescale = 1.0 / float(maxcolors)
+    del imagedata, edged  # Source image tuple is not needed anymore, maps above keep only rows they use
 
-    resultfile.write('\n#declare thething = mesh {\n')  # Opening mesh object "thething"
-
-    # Now going to cycle through image and build mesh
-
-    for y in range(0, Y, 1):
-
-        message = f'Processing row {str(y)} of {str(Y)}...'
-        sortir.deiconify()
-        zanyato.config(text=message)
-        sortir.update()
-        sortir.update_idletasks()
-
-        resultfile.write(f'\n\n    // Row {y}\n')
-
-        for x in range(0, X, 1):
-
-            v9 = srcY(x, y)  # Current pixel to process and write. Then going to neighbours
-            v1 = 0.25 * (v9 + srcY(x - 1, y - 1) + srcY(x, y - 1) + srcY(x - 1, y))
-            v3 = 0.25 * (v9 + srcY(x, y - 1) + srcY(x + 1, y - 1) + srcY(x + 1, y))
-            v5 = 0.25 * (v9 + srcY(x + 1, y) + srcY(x + 1, y + 1) + srcY(x, y + 1))
-            v7 = 0.25 * (v9 + srcY(x, y + 1) + srcY(x - 1, y + 1) + srcY(x - 1, y))
-
-            # finally going to build pyramid
-
-            resultfile.write(
-                f'\n        triangle {{<{xRescale*(x-0.5+xOffset)}, {yRescale*(y-0.5+yOffset)}, map({zRescale*v1})> <{xRescale*(x+xOffset)}, {yRescale*(y+yOffset)}, map({zRescale*v9})> <{xRescale*(x+0.5+xOffset)}, {yRescale*(y-0.5+yOffset)}, map({zRescale*v3})>}}'
-            )  # Triangle 2 1-9-3
-
-            resultfile.write(
-                f'\n        triangle {{<{xRescale*(x+0.5+xOffset)}, {yRescale*(y-0.5+yOffset)}, map({zRescale*v3})> <{xRescale*(x+xOffset)}, {yRescale*(y+yOffset)}, map({zRescale*v9})> <{xRescale*(x+0.5+xOffset)}, {yRescale*(y+0.5+yOffset)}, map({zRescale*v5})>}}'
-            )  # Triangle 4 3-9-5
+    # end of Luminance map block
+    # --------------------------------------------------------------
 
-            resultfile.write(
-                f'\n        triangle {{<{xRescale*(x+0.5+xOffset)}, {yRescale*(y+0.5+yOffset)}, map({zRescale*v5})> <{xRescale*(x+xOffset)}, {yRescale*(y+yOffset)}, map({zRescale*v9})> <{xRescale*(x-0.5+xOffset)}, {yRescale*(y+0.5+yOffset)}, map({zRescale*v7})>}}'
-            )  # Triangle 6 5-9-7
+    # 	WRITING POV FILE
+    # Result file is opened as unbuffered binary file, mesh text is built as bytes and written without any buffering layers.
+    # File is closed on leaving the block even if something goes wrong while writing.
+
+    with open(resultfilename, 'wb', buffering=0) as resultfile:
+
+        def dump(chunk):
+            '''
+            Writes bytes to result file, repeating until everything is written
+            '''
+            view = memoryview(chunk)
+            while view:
+                view = view[resultfile.write(view) :]
+
+        # end of dump function
+
+        seconds = time()
+        localtime = ctime(seconds)  # will be used for debug info
+
+        # ------------
+        #  POV header
+        # ---
+
+        dump(
+            ''.join(
+                [
+                    '/*\n',
+                    'Persistence of Vision Ray Tracer Scene Description File\n',
+                    'Version: 3.7\n',
+                    'Description: A triangle mesh scene file converted from PNG image heightfield.\n',
+                    '   Coordinate system mimic Photoshop, i.e. the origin is top left corner.\n',
+                    '   Z axis points toward viewer.\n\n',
+                    'IMPORTANT:\n',
+                    '   File may be directly used as include, if the main file contain the following:\n\n',
+                    '       #declare Main = 1;\n',
+                    '       #include "filename.inc"\n',
+                    '       object {thething}\n\n',
+                    '   "Main" variable turns off camera etc in include, allowing main file to work.\n\n',
+                    'Author: Automatically generated by img2mesh program\n',
+                    '   https://github.com/Dnyarri/img2mesh\n',
+                    '   https://gitflic.ru/project/dnyarri/img2mesh\n',
+                    'developed by Ilya Razmanov aka Ilyich the Toad\n',
+                    '   https://dnyarri.github.io\n',
+                    '   mailto:ilyarazmanov@gmail.com\n\n',
+                    f'Generated by: {__file__} version: {__version__} at: {localtime}\n'
+                    f'Converted from: {sourcefilename}\n'
+                    f'Source info: {info}\n'
+                    '*/\n\n',
+
+                    #  Statements
+
+                    '\n',
+                    '#version 3.7;\n\n',
+                    '#ifndef (Main)  // Include check 1\n\n',
+                    '  global_settings{\n',
+                    '    max_trace_level 3   // Set low to speed up rendering. May need to be increased for metals and glasses\n',
+                    '    adc_bailout 0.01    // Set high to speed up rendering. May need to be decreased to 1/256 for better quality\n',
+                    '    ambient_light <0.5, 0.5, 0.5>\n',
+                    '    assumed_gamma 1.0\n  }\n\n',
+                    '  #include "colors.inc"\n',
+                    '  #include "finish.inc"\n',
+                    '  #include "metals.inc"\n',
+                    '  #include "golds.inc"\n\n',
+                    '#end  // End check 1\n\n',
+                    '\n/*    Map function\nMaps are transfer functions z value is passed through.\nResult is similar to Photoshop or GIMP "Curves" applied to source heightfield PNG,\nbut here map is nondestructively applied to mesh within POVRay.\nBy default exported map is five points linear spline, corresponding to straight line\ndescribing "identical" transform, i.e. input = output.\nYou can both edit existing control points and add new ones. Note that points order is irrelevant\nsince POVRay will resort vectors according to entry value (first digits in the row before comma),\nso you can add middle points at the end of the list below or write the whole list upside down. */\n\n',
+                    '#ifndef (Curve)\n',
+                    '  #declare Curve = function {  // Spline curve construction begins\n',
+                    '    spline { linear_spline\n',
+                    '      0.0,   <0.0,   0>\n',
+                    '      0.25,  <0.25,  0>\n',
+                    '      0.5,   <0.5,   0>\n',
+                    '      0.75,  <0.75,  0>\n',
+                    '      1.0,   <1.0,   0>}\n    }  // Construction complete\n',
+                    '#end\n',
+                    '#ifndef (map) #declare map = function(c) {Curve(c).u}; #end  // Spline curve assigned as map\n',
+
+                    # Camera and light
+
+                    '\n#ifndef (Main)  // Include check 2\n\n',
+                    '/*  Camera\n\n',
+                    'Coordinate system for the whole scene match Photoshop\n',
+                    'Origin is top left, z points at you */\n\n',
+                    '#declare camera_position = <0.0, 0.0, 3.0>;  // Camera position over object, used for angle\n\n',
+                    'camera {\n',
+                    '  // orthographic\n',
+                    '  location camera_position\n',
+                    '  right x*image_width/image_height\n',
+                    '  up y\n',
+                    '  sky <0, -1, 0>\n',
+                    '  direction <0, 0, vlength(camera_position - <0.0, 0.0, 1.0>)>  // May alone work for many objects. Otherwise fiddle with angle below\n',
+                    f'//  angle 2.0*(degrees(atan2({0.5 * max(X,Y)/X}, vlength(camera_position - <0.0, 0.0, 1.0>)))) // Supposed to fit object\n',
+                    '  look_at<0.0, 0.0, 0.5>\n',
+                    '}\n\n',
+                    'light_source {0*x\n',
+                    '    color rgb <1.0, 1.0, 1.0>\n',
+                    '//    area_light <1, 0, 0>, <0, 1, 0>, 5, 5 circular orient area_illumination on\n',
+                    '    translate <-5, -5, 5>\n',
+                    '}\n',
+                    '\n//  Layered thething texture\n',
+                    '#declare thething_texture_bottom =    // Smooth z gradient\n',
+                    '  texture {\n',
+                    '    pigment {\n',
+                    '    gradient z\n',
+                    '      colour_map {\n',
+                    '        [0.0, rgb <1, 0, 0>]\n',
+                    '        [0.5, rgb <0, 0, 1>]\n',
+                    '        [1.0, rgb <1, 1, 1>]\n',
+                    '      }\n',
+                    '    }\n',
+                    '    finish {phong 1.0}\n',
+                    '  }\n\n',
+                    '#declare thething_texture_top =       // Sharp horizontals overlay\n',
+                    '  #declare line_width = 0.01;\n',
+                    '  texture {\n',
+                    '    pigment {\n',
+                    '    gradient z\n',
+                    '      colour_map {\n',
+                    '        [0.0, rgbt <0,0,0,1>]\n',
+                    '        [0.5 - line_width, rgbt <0,0,0,1>]\n',
+                    '        [0.5 - line_width, rgbt <0,0,0,0>]\n',
+                    '        [0.5, rgbt <0,0,0,0>]\n',
+                    '        [0.5 + line_width, rgbt <0,0,0,0>]\n',
+                    '        [0.5 + line_width, rgbt <0,0,0,1>]\n',
+                    '        [1.0, rgbt <0,0,0,1>]\n',
+                    '      }\n',
+                    '    }\n',
+                    '    scale 0.1\n',
+                    '  }\n\n',
+                    '#declare thething_texture =           // Overall texture used in the end\n',
+                    '    texture {thething_texture_bottom}\n',
+                    '    texture {thething_texture_top}\n',
+                    '\n\n#end // End check 2\n',
+                    '\n\n// Main mesh "thething" begins. NOW!\n',
+                ]
+            ).encode()
+        )
+
+        # Mesh
+
+        # Global positioning and scaling to tweak.
+
+        xOffset = -0.5 * float(X - 1)  # To be added BEFORE rescaling to center object.
+        yOffset = -0.5 * float(Y - 1)  # To be added BEFORE rescaling to center object
+
+        yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
+        zRescale = 1.0 / float(maxcolors)
+
+        # Pyramid vertex coordinates take only three values per pixel along each axis,
+        # so they are calculated and formatted to text once for every column and row instead of for every vertex written.
+        # %.7g rounds coordinates to 7 significant digits, i.e. about 1e-7 relative error, well below visual resolution,
+        # while full float repr would take up to 17 digits per number. Like any %g it never writes trailing zeros.
+        # Mesh is pure ASCII, so numbers are formatted straight to bytes, and mesh text never needs encoding.
+
+        xMinus = [b'%.7g' % (xRescale * (x - 0.5 + xOffset)) for x in range(X)]
+        xCenter = [b'%.7g' % (xRescale * (x + xOffset)) for x in range(X)]
+        xPlus = [b'%.7g' % (xRescale * (x + 0.5 + xOffset)) for x in range(X)]
+        yMinus = [b'%.7g' % (yRescale * (y - 0.5 + yOffset)) for y in range(Y)]
+        yCenter = [b'%.7g' % (yRescale * (y + yOffset)) for y in range(Y)]
+        yPlus = [b'%.7g' % (yRescale * (y + 0.5 + yOffset)) for y in range(Y)]
+
+        # Heights take a limited number of distinct values, integer pixel values for centers and quarters of integer sums for corners,
+        # and real images repeat them a lot. So every distinct height present is rescaled and formatted to text once,
+        # and mesh rows only look texts up.
+
+        zCenterText = {v: b'%.7g' % (zRescale * v) for v in set(chain.from_iterable(lum))}
+        zCornerText = {v: b'%.7g' % (zRescale * v) for v in set(chain.from_iterable(corner))}
+
+        # Mesh is written as mesh2, i.e. list of vertices followed by list of triangles referring to vertices by number,
+        # so every vertex is formatted and parsed once instead of once for every triangle using it.
+        # Pyramid corners are shared with neighbour pyramids, so vertices are corner nodes row by row first,
+        # (X + 1) * (Y + 1) of them, then pixel centers, X * Y of them, numbered from 0 in the order they are written.
+        # POVRay comma after vector is optional, so every entry is followed by comma, the last one included.
+
+        dump(
+            b''.join(
+                [
+                    b'\n#declare thething = mesh2 {\n',  # Opening mesh object "thething"
+                    b'    vertex_vectors {\n',
+                    b'        %d,' % ((X + 1) * (Y + 1) + X * Y),
+                ]
+            )
+        )
+
+        # Corner node coordinates are pyramid corner coordinates plus the closing one after the last pixel
+
+        xNode = xMinus + [xPlus[-1]]
+        yNode = yMinus + [yPlus[-1]]
+
+        # Vertex rows are kept as separate coordinate columns, and vertex template is mapped over their zip,
+        # so the whole row is formatted without Python level cycle. All numbers come preformatted, so template only pastes texts.
+
+        vertex = b'\n        <%s, %s, map(%s)>,'
+
+        # Rows are processed in strips, each strip is collected into one text and written at once,
+        # and progress is reported once per strip instead of once per row.
+        # Strip height depends on image width so that one strip is about 2048 pixels, i.e. about 0.25 Mb of triangle text,
+        # keeping the number of writes low for small images without holding huge text in memory for wide ones.
+
+        strip = max(1, 2048 // X)  # Rows per strip
+
+        # Finished strip is written by separate thread while next strip is being formatted.
+        # File output releases GIL while writing to disk, so it overlaps with text building. Single worker keeps strips in order,
+        # and waiting for previous strip before passing next one keeps no more than one strip queued.
+
+        writer = ThreadPoolExecutor(max_workers=1)
+        written = writer.submit(dump, b'\n\n        // Corner nodes')
+
+        try:
+            # Corner nodes first
+
+            sortir.deiconify()
+            zanyato.config(text='Writing corner vertices...')
+            sortir.update()
+            sortir.update_idletasks()
+
+            for jstrip in range(0, Y + 1, strip):
+                striptext = []
+                for y1, heights in zip(yNode[jstrip : jstrip + strip], corner[jstrip : jstrip + strip]):
+                    striptext.extend(map(vertex.__mod__, zip(xNode, repeat(y1), map(zCornerText.__getitem__, heights))))
+
+                written.result()  # Previous strip written
+                written = writer.submit(dump, b''.join(striptext))  # Strip complete, passing it to writer
+
+            # Now going to cycle through image and write pixel centers
+
+            for ystrip in range(0, Y, strip):
+
+                ystripend = min(ystrip + strip, Y)
+
+                message = f'Processing rows {str(ystrip)}-{str(ystripend - 1)} of {str(Y)}...'
+                sortir.deiconify()
+                zanyato.config(text=message)
+                sortir.update()
+                sortir.update_idletasks()
+
+                striptext = []  # Whole strip of pixel centers is collected here and then written at once
+
+                for y in range(ystrip, ystripend, 1):
+                    striptext.append(b'\n\n        // Row %d' % y)
+                    striptext.extend(map(vertex.__mod__, zip(xCenter, repeat(yCenter[y]), map(zCenterText.__getitem__, lum[y]))))
+
+                written.result()  # Previous strip written
+                written = writer.submit(dump, b''.join(striptext))  # Strip complete, passing it to writer
+
+            # Pixel with all four corners at its own height is a flat square, and two triangles along its diagonal
+            # describe it exactly as well as four triangles around its center, so flat pixels get two triangles only.
+            # Flat background of real heightfields is thus written with half the triangles.
+            # Center vertex of flat pixel stays in the list unused, keeping vertex numbering simple.
+
+            flat = []
+            for lumrow, cornerminus, cornerplus in zip(lum, corner, corner[1:]):
+                flat.append(bytes([v9 == v1 == v3 == v5 == v7 for v9, v1, v3, v5, v7 in zip(lumrow, cornerminus, cornerminus[1:], cornerplus[1:], cornerplus)]))
+
+            faces = 4 * X * Y - 2 * sum(map(sum, flat))  # Number of triangles
+
+            written.result()
+            written = writer.submit(dump, b'\n    }\n    face_indices {\n        %d,' % faces)  # Vertices closed, triangles opened
+
+            sortir.deiconify()
+            zanyato.config(text='Writing triangles...')
+            sortir.update()
+            sortir.update_idletasks()
+
+            # Pyramids of the row are made of corner nodes of rows y and y + 1 and pixel centers of row y.
+            # Every corner node number is used by up to eight triangles and every center number by four,
+            # so vertex numbers are formatted to text once per row of vertices, and the template only pastes texts.
+            # Lower corner row of one pixel row is the upper corner row of the next one, so its texts are carried over.
+            # The template of four triangles is mapped over zip of number rows shifted against each other.
+
+            number = b'%d'
+            face = b'\n        <%s, %s, %s>,'
+            pyramid = face * 4  # Triangles 2 1-9-3, 4 3-9-5, 6 5-9-7, 8 7-9-1
+            square = face * 2  # Triangles 1-5-3, 5-1-7 for flat pixel, same winding as pyramid
+
+            centerbase = (X + 1) * (Y + 1)  # Number of first pixel center vertex
+
+            cornerplus = list(map(number.__mod__, range(0, X + 1)))  # Corners at y - 0.5 for the first row
 
-            resultfile.write(
-                f'\n        triangle {{<{xRescale*(x-0.5+xOffset)}, {yRescale*(y+0.5+yOffset)}, map({zRescale*v7})> <{xRescale*(x+xOffset)}, {yRescale*(y+yOffset)}, map({zRescale*v9})> <{xRescale*(x-0.5+xOffset)}, {yRescale*(y-0.5+yOffset)}, map({zRescale*v1})>}}'
-            )  # Triangle 8 7-9-1
+            for ystrip in range(0, Y, strip):
 
-        # Pyramid construction complete. Ave me!
+                striptext = []
 
-    resultfile.writelines(
-        [
-            '\n\n  inside_vector <0, 0, 1>\n\n',
-            f'//  clipped_by {{plane {{-z, -{zRescale}}}}}  // Variant of cropping baseline on minimal color step\n\n'
-            '}\n//    Closed thething\n\n',  # Main object thething finished
-            '\n#ifndef (Main)  // Include check 3\n\n',
-            '#declare boxedthing = object {\n',
-            '  intersection {\n',
-            '    box {<-0.5, -0.5, 0>, <0.5, 0.5, 1.0>\n',
-            '          pigment {rgb <0.5, 0.5, 5>}\n',
-            '        }\n',
-            '    object {thething texture {thething_texture}}\n',
-            '  }\n',
-            '}',
-            '//    Constructed CGS "boxedthing" of mesh plus bounding box thus adding side walls and bottom\n\n',
-            'object {boxedthing}\n\n',
-            '\n#end// End check 3\n\n',
-            '\n/*\n\nhappy rendering\n\n  0~0\n (---)\n(.>|<.)\n-------\n\n*/',
-        ]
-    )  # Closing solids
+                for y in range(ystrip, min(ystrip + strip, Y), 1):
+                    cornerminus = cornerplus  # Corners at y - 0.5, carried over from previous row
+                    cornerplus = list(map(number.__mod__, range((y + 1) * (X + 1), (y + 2) * (X + 1))))  # Corners at y + 0.5
+                    centers = list(map(number.__mod__, range(centerbase + y * X, centerbase + y * X + X)))  # Pixel centers
 
-    # Close output
-    resultfile.close()
+                    n1 = cornerminus  # Corners at x - 0.5, y - 0.5
+                    n3 = cornerminus[1:]  # Corners at x + 0.5, y - 0.5
+                    n5 = cornerplus[1:]  # Corners at x + 0.5, y + 0.5
+                    n7 = cornerplus  # Corners at x - 0.5, y + 0.5
+                    n9 = centers
+
+                    if 1 in flat[y]:  # Row has flat pixels, pyramid or square is chosen for every pixel
+                        striptext.extend(
+                            square % (v1, v5, v3, v5, v1, v7) if isflat else pyramid % (v1, v9, v3, v3, v9, v5, v5, v9, v7, v7, v9, v1)
+                            for isflat, v1, v3, v5, v7, v9 in zip(flat[y], n1, n3, n5, n7, n9)
+                        )
+                    else:  # No flat pixels, the whole row is pyramids
+                        striptext.extend(map(pyramid.__mod__, zip(n1, n9, n3, n3, n9, n5, n5, n9, n7, n7, n9, n1)))
+
+                written.result()  # Previous strip written
+                written = writer.submit(dump, b''.join(striptext))  # Strip complete, passing it to writer
+
+            # Pyramid construction complete. Ave me!
+
+            written.result()
+        finally:
+            writer.shutdown()  # Waits for the strip still being written, so output is never closed under the writer
+
+        dump(b'\n    }')  # Triangles closed
+
+        dump(
+            ''.join(
+                [
+                    '\n\n  inside_vector <0, 0, 1>\n\n',
+                    f'//  clipped_by {{plane {{-z, -{zRescale}}}}}  // Variant of cropping baseline on minimal color step\n\n'
+                    '}\n//    Closed thething\n\n',  # Main object thething finished
+                    '\n#ifndef (Main)  // Include check 3\n\n',
+                    '#declare boxedthing = object {\n',
+                    '  intersection {\n',
+                    '    box {<-0.5, -0.5, 0>, <0.5, 0.5, 1.0>\n',
+                    '          pigment {rgb <0.5, 0.5, 5>}\n',
+                    '        }\n',
+                    '    object {thething texture {thething_texture}}\n',
+                    '  }\n',
+                    '}',
+                    '//    Constructed CGS "boxedthing" of mesh plus bounding box thus adding side walls and bottom\n\n',
+                    'object {boxedthing}\n\n',
+                    '\n#end// End check 3\n\n',
+                    '\n/*\n\nhappy rendering\n\n  0~0\n (---)\n(.>|<.)\n-------\n\n*/',
+                ]
+            ).encode()
+        )  # Closing solids
+
+    # Output closed on leaving with block
 
     # --------------------------------------------------------------
     # Destroying dialog
@@ -12,6 +12,7 @@ History:
 1.0.1.0     Program converted into self-calling function to have a possibility to import it.  
 1.9.1.0     Multiple changes everywhere lead to whole product update. Versioning changed to MAINVERSION.MONTH since Jan 2024.DAY.subversion  
 1.13.3.0    Maintenance update, minor code cleanup.  
+1.34.16.0   Facets and side walls lying on the bottom of zero height regions are skipped.  
 
 -------------------
 Main site:
@@ -27,11 +28,14 @@ __author__ = "Ilya Razmanov"
 __copyright__ = "(c) 2024 Ilya Razmanov"
 __credits__ = "Ilya Razmanov"
 __license__ = "unlicense"
-__version__ = "1.13.3.0"
+__version__ = "1.34.16.0"
 __maintainer__ = "Ilya Razmanov"
 __email__ = "ilyarazmanov@gmail.com"
 __status__ = "Production"
 
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
 from tkinter import Label, Tk, filedialog
 
@@ -103,57 +107,42 @@ def img2stl():
         return None
         # break if user press 'Cancel'
 
-    resultfile = open(resultfilename, 'w')
-    # result file opened
-
-    # Both files opened
-
     # --------------------------------------------------------------
-    # Functions block:
+    # Luminance map block:
     #
-    # src a-la FM style src(x,y,z)
-    # Image should be opened as "imagedata" by main program before
-    # Note that X, Y, Z are not determined in function, you have to determine it in main program
-
-    def src(x, y, z):
-        '''
-        Analog of src from FilterMeister, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        position = (cx * Z) + z  # Here is the main magic of turning two x, z into one array position
-        channelvalue = int((imagedata[cy])[position])
-
-        return channelvalue
-
-    # end of src function
-
-    def srcY(x, y):
-        '''
-        Converting to greyscale, returns Yntensity, force repeat edge instead of out of range
-        '''
-        cx = x
-        cx = max(0, cx)
-        cx = min((X - 1), cx)
-        cy = y
-        cy = max(0, cy)
-        cy = min((Y - 1), cy)
-
-        if info['planes'] < 3:  # supposedly L and LA
-            Yntensity = src(x, y, 0)
-        else:  # supposedly RGB and RGBA
-            Yntensity = int(0.2989 * src(x, y, 0) + 0.587 * src(x, y, 1) + 0.114 * src(x, y, 2))
-
-        return Yntensity
-
-    # end of srcY function
-    #
-    # end of Functions block
+    # Whole image is converted to greyscale once, before building mesh,
+    # so main cycle only reads precomputed values instead of calling src for every channel of every neighbour.
+    # lum[y][x] holds exactly the same Yntensity former srcY(x, Y - 1 - y) used to calculate pixel by pixel.
+
+    # Interleaved pixel rows are split into separate channel planes with stride slices,
+    # so channels are walked in parallel with zip instead of calculating position of every channel of every pixel.
+
+    # Rows are read in reverse order, so the map is Y-mirrored once to mimic Photoshop coordinate system
+    # instead of calculating mirrored row number on every read.
+    # Map rows are kept as compact PyPNG rows or arrays of unsigned short rather than lists of Python ints.
+
+    if Z == 1:  # supposedly L, the most common heightfield, rows are taken as is
+        lum = list(reversed(imagedata))
+    elif Z == 2:  # supposedly LA, slice of PyPNG row is compact row as well
+        lum = [row[0::Z] for row in reversed(imagedata)]
+    else:  # supposedly RGB and RGBA
+        lum = [array('H', [int(0.2989 * r + 0.587 * g + 0.114 * b) for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])]) for row in reversed(imagedata)]
+
+    # Pyramid corners are shared by four neighbour pixels, so their heights are calculated for the whole image at once
+    # instead of reading the same pixels up to four times for every pixel.
+    # Edges are repeated once while building instead of clamping coordinates on every read:
+    # edge rows are referenced twice rather than copied, and edge columns are repeated in the row of vertical pair sums.
+    # Then corner[y][x] is the average of the four pixels around the node between pixels (x - 1, y - 1) and (x, y).
+    # Corner heights are multiples of 0.25 not exceeding 65535, so single precision float array holds them exactly at 4 bytes each.
+
+    edged = [lum[0]] + lum + [lum[-1]]
+    corner = []
+    for upper, lower in zip(edged, edged[1:]):
+        pairsum = [a + b for a, b in zip(upper, lower)]
+        pairsum = [pairsum[0]] + pairsum + [pairsum[-1]]
+        corner.append(array('f', [0.25 * (a + b) for a, b in zip(pairsum, pairsum[1:])]))
+
+    # end of Luminance map block
     # --------------------------------------------------------------
 
     # Global positioning and scaling to tweak. Offset supposed to make everyone feeling positive, rescale supposed to scale anything to [0..1.0] regardless of what the units are
@@ -165,203 +154,212 @@ def img2stl():
     yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
     zRescale = 1.0 / float(maxcolors)
 
+    # Pyramid vertex coordinates take only three values per pixel along each axis,
+    # so they are calculated and formatted to STL text once for every column and row instead of for every vertex written.
+
+    xMinus = [b'%e' % (xRescale * (x - 0.5 + xOffset)) for x in range(X)]
+    xCenter = [b'%e' % (xRescale * (x + xOffset)) for x in range(X)]
+    xPlus = [b'%e' % (xRescale * (x + 0.5 + xOffset)) for x in range(X)]
+    yMinus = [b'%e' % (yRescale * (y - 0.5 + yOffset)) for y in range(Y)]
+    yCenter = [b'%e' % (yRescale * (y + yOffset)) for y in range(Y)]
+    yPlus = [b'%e' % (yRescale * (y + 0.5 + yOffset)) for y in range(Y)]
+
+    # Heights take no more distinct values than there are pixel levels, and usually much less than there are vertices,
+    # so every distinct height is rescaled and formatted once, and vertices only look its text up.
+
+    zLum = {v: b'%e' % (zOffset + zRescale * v) for v in set(chain.from_iterable(lum))}
+    zCorner = {v: b'%e' % (zOffset + zRescale * v) for v in set(chain.from_iterable(corner))}
+
+    z0 = b'%e' % (zOffset + 0.0)  # Bottom height
+
     # 	WRITING STL FILE, finally
+    # Result file is opened as unbuffered binary file, mesh text is built as bytes and written without any buffering layers.
+    # File is closed on leaving the block even if something goes wrong while writing.
+
+    with open(resultfilename, 'wb', buffering=0) as resultfile:
+
+        def dump(chunk):
+            '''
+            Writes bytes to result file, repeating until everything is written
+            '''
+            view = memoryview(chunk)
+            while view:
+                view = view[resultfile.write(view) :]
+
+        # end of dump function
+
+
+        dump(b'solid pryanik_nepechatnyj\n')  # opening object
 
-    resultfile.write('solid pryanik_nepechatnyj\n')  # opening object
-
-    # Now going to cycle through image and build mesh
-
-    for y in range(0, Y, 1):
-
-        message = f'Processing row {str(y)} of {str(Y)}...'
-        sortir.deiconify()
-        zanyato.config(text=message)
-        sortir.update()
-        sortir.update_idletasks()
-
-        for x in range(0, X, 1):
-
-            # Since I was unable to find clear declaration of coordinate system, I'll plug a coordinate switch here
-
-            # Reading switch:
-            xRead = x
-            yRead = Y - 1 - y
-            # 'yRead = Y - y' coordinate mirror to mimic Photoshop coordinate system; +/- 1 steps below are inverted correspondingly vs. original img2mesh
-
-            # Remains of Writing switch. No longer used since v. 0.1.0.2 but var names remained so dummy plug must be here.
-            xWrite = x
-            yWrite = y
-
-            v9 = srcY(xRead, yRead)  # Current pixel to process and write. Then going to neighbours
-            v1 = 0.25 * (v9 + srcY((xRead - 1), yRead) + srcY((xRead - 1), (yRead + 1)) + srcY(xRead, (yRead + 1)))
-            v3 = 0.25 * (v9 + srcY(xRead, (yRead + 1)) + srcY((xRead + 1), (yRead + 1)) + srcY((xRead + 1), yRead))
-            v5 = 0.25 * (v9 + srcY((xRead + 1), yRead) + srcY((xRead + 1), (yRead - 1)) + srcY(xRead, (yRead - 1)))
-            v7 = 0.25 * (v9 + srcY(xRead, (yRead - 1)) + srcY((xRead - 1), (yRead - 1)) + srcY((xRead - 1), yRead))
-
-            # finally going to pyramid building
-
-            # top part begins
-            resultfile.writelines(
-                [
-                    '   facet normal 0 0 1\n',  # triangle 2 normal up
-                    '       outer loop\n',  # 1 - 9 - 3
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                    '   facet normal 0 0 1\n',  # triangle 4 normal up
-                    '       outer loop\n',  # 3 - 9 - 5
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                    '   facet normal 0 0 1\n',  # triangle 6 normal up
-                    '       outer loop\n',  # 5 - 9 - 7
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                    '   facet normal 0 0 1\n',  # triangle 8 normal up
-                    '       outer loop\n',  # 7 - 9 - 1
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+zRescale*v9):e}\n',
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                ]
-            )
-            # top part ends
-
-            # left side begins
-            if x == 0:
-                resultfile.writelines(
-                    [
-                        '   facet normal -1 0 0\n',  # triangle 8- normal left
-                        '       outer loop\n',  # 1 - down1 - 7
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                        '   facet normal -1 0 0\n',  # triangle 8- normal left
-                        '       outer loop\n',  # down1 - down7 - 7
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                    ]
-                )
-            # left side ends
-
-            # right side begins
-            if x == (X - 1):
-                resultfile.writelines(
-                    [
-                        '   facet normal 1 0 0\n',  # triangle 4+ normal left
-                        '       outer loop\n',  # 5 - down5 - 3
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                        '   facet normal 1 0 0\n',  # triangle 4+ normal left
-                        '       outer loop\n',  # 3 - down5 - down3
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                    ]
-                )
-            # right side ends
-
-            # far side begins
-            if y == 0:
-                resultfile.writelines(
-                    [
-                        '   facet normal 0 -1 0\n',  # triangle 2- normal far
-                        '       outer loop\n',  # 3 - down - 1
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v3):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                        '   facet normal 0 -1 0\n',  # triangle 2- normal far
-                        '       outer loop\n',  # down - down - 1
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+zRescale*v1):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                    ]
-                )
-            # far side ends
-
-            # close side begins
-            if y == (Y - 1):
-                resultfile.writelines(
-                    [
-                        '   facet normal 0 1 0\n',  # triangle 6+ normal close
-                        '       outer loop\n',  # 7 - down - 5
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v7):e}\n',
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                        '   facet normal 0 1 0\n',  # triangle 6+ normal close
-                        '       outer loop\n',  # down - down - 5
-                        f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                        f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+zRescale*v5):e}\n',
-                        '       endloop\n',
-                        '   endfacet\n',
-                    ]
-                )
-            # close side ends
-
-            # bottom part begins
-            resultfile.writelines(
-                [
-                    '   facet normal 0 0 -1\n',  # triangle 2 normal up
-                    '       outer loop\n',  # 1 - 9 - 3
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                    '   facet normal 0 0 -1\n',  # triangle 4 normal up
-                    '       outer loop\n',  # 3 - 9 - 5
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                    '   facet normal 0 0 -1\n',  # triangle 6 normal up
-                    '       outer loop\n',  # 5 - 9 - 7
-                    f'           vertex {(xRescale*(xWrite+0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                    '   facet normal 0 0 -1\n',  # triangle 8 normal up
-                    '       outer loop\n',  # 7 - 9 - 1
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite+0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite+xOffset)):e} {(yRescale*(yWrite+yOffset)):e} {(zOffset+0.0):e}\n',
-                    f'           vertex {(xRescale*(xWrite-0.5+xOffset)):e} {(yRescale*(yWrite-0.5+yOffset)):e} {(zOffset+0.0):e}\n',
-                    '       endloop\n',
-                    '   endfacet\n',
-                ]
-            )
-            # bottom part ends
-
-    resultfile.write('endsolid pryanik_nepechatnyj')  # closing object
-
-    # Close output
-    resultfile.close()
+        # Every facet differs from the others only by its normal and vertex numbers, so each part of the pyramid
+        # with all its static text is a single template, and every part is filled with one % operation
+        # instead of formatting every vertex line separately.
+        # STL is pure ASCII, so templates are bytes, and strips are compact byte strings rather than lists of str to be encoded.
+
+        loop = b'       outer loop\n' + 3 * b'           vertex %s %s %s\n' + b'       endloop\n   endfacet\n'
+
+        up = b'   facet normal 0 0 1\n' + loop  # Top triangle
+        down = b'   facet normal 0 0 -1\n' + loop  # Bottom triangle
+        top = up * 4  # Triangles 2, 4, 6, 8 normal up
+        bottom = down * 4  # Triangles 2, 4, 6, 8 normal down
+        left = b'   facet normal -1 0 0\n' + loop  # Triangle 8- normal left
+        right = b'   facet normal 1 0 0\n' + loop  # Triangle 4+ normal right
+        far = b'   facet normal 0 -1 0\n' + loop  # Triangle 2- normal far
+        close = b'   facet normal 0 1 0\n' + loop  # Triangle 6+ normal close
+
+        # Now going to cycle through image and build mesh.
+        # Rows are processed in strips, each strip is collected into one text and written at once,
+        # and progress is reported once per strip instead of once per row.
+        # Strip height depends on image width so that one strip is about 2048 pixels,
+        # keeping the number of writes low for small images without holding huge text in memory for wide ones.
+
+        strip = max(1, 2048 // X)  # Rows per strip
+
+        # Finished strip is written by separate thread while next strip is being formatted.
+        # File output releases GIL while writing to disk, so it overlaps with text building. Single worker keeps strips in order,
+        # and waiting for previous strip before passing next one keeps no more than one strip queued.
+
+        writer = ThreadPoolExecutor(max_workers=1)
+        written = writer.submit(dump, b'')  # Nothing to wait for before the first strip
+
+        try:
+            for ystrip in range(0, Y, strip):
+
+                ystripend = min(ystrip + strip, Y)
+
+                message = f'Processing rows {str(ystrip)}-{str(ystripend - 1)} of {str(Y)}...'
+                sortir.deiconify()
+                zanyato.config(text=message)
+                sortir.update()
+                sortir.update_idletasks()
+
+                striptext = []  # Whole strip of pyramids is collected here and then written at once
+
+                for y in range(ystrip, ystripend, 1):
+
+                    # Pixel with all four corners at zero height is zero itself, and its top lies right on its bottom.
+                    # Such top and bottom enclose nothing, so both are skipped, and the neighbours' top and bottom
+                    # meet at their shared zero edge, keeping the solid closed.
+                    # Rows lying on the bottom entirely, like black borders, are skipped at once without walking them.
+
+                    if not (any(corner[y]) or any(corner[y + 1])):
+                        continue
+
+                    # Rows needed for the whole row of pyramids are fetched once, x cycle below only walks them.
+                    # Maps are already mirrored, so row y of image is row y of maps, and rows are walked in natural order.
+
+                    lumrow = list(map(zLum.__getitem__, lum[y]))
+                    cornerminus = list(map(zCorner.__getitem__, corner[y]))  # Corners at y - 0.5
+                    cornerplus = list(map(zCorner.__getitem__, corner[y + 1]))  # Corners at y + 0.5
+
+                    y1 = yMinus[y]
+                    y9 = yCenter[y]
+                    y5 = yPlus[y]
+
+                    # Walking columns with zip so neighbour values come in one tuple instead of five separate double indexings
+
+                    for z9, z1, z3, z5, z7, x1, x9, x3 in zip(lumrow, cornerminus, cornerminus[1:], cornerplus[1:], cornerplus, xMinus, xCenter, xPlus):
+                        # z9 is current pixel height text, z1, z3, z5, z7 are corners shared with neighbours
+
+                        if z1 == z3 == z5 == z7 == z0:
+                            continue  # Pixel lies on the bottom, nothing to build
+
+                        if z9 == z0:
+                            # Zero pixel next to non-zero ones. Triangle between two zero corners lies on the bottom as well,
+                            # so only triangles rising to non-zero corners are built, each with its own bottom triangle
+                            for xa, ya, za, xb, yb, zb in ((x1, y1, z1, x3, y1, z3), (x3, y1, z3, x3, y5, z5), (x3, y5, z5, x1, y5, z7), (x1, y5, z7, x1, y1, z1)):
+                                if za == zb == z0:
+                                    continue
+                                striptext.append(up % (xa, ya, za, x9, y9, z9, xb, yb, zb))
+                                striptext.append(down % (xa, ya, z0, x9, y9, z0, xb, yb, z0))
+                            continue
+
+                        # finally going to pyramid building
+
+                        # top part begins
+                        striptext.append(
+                            top
+                            % (
+                                x1, y1, z1, x9, y9, z9, x3, y1, z3,  # triangle 2, 1 - 9 - 3
+                                x3, y1, z3, x9, y9, z9, x3, y5, z5,  # triangle 4, 3 - 9 - 5
+                                x3, y5, z5, x9, y9, z9, x1, y5, z7,  # triangle 6, 5 - 9 - 7
+                                x1, y5, z7, x9, y9, z9, x1, y1, z1,  # triangle 8, 7 - 9 - 1
+                            )
+                        )
+                        # top part ends
+
+                        # bottom part begins
+                        striptext.append(
+                            bottom
+                            % (
+                                x1, y1, z0, x9, y9, z0, x3, y1, z0,  # triangle 2, 1 - 9 - 3
+                                x3, y1, z0, x9, y9, z0, x3, y5, z0,  # triangle 4, 3 - 9 - 5
+                                x3, y5, z0, x9, y9, z0, x1, y5, z0,  # triangle 6, 5 - 9 - 7
+                                x1, y5, z0, x9, y9, z0, x1, y1, z0,  # triangle 8, 7 - 9 - 1
+                            )
+                        )
+                        # bottom part ends
+
+                written.result()  # Previous strip written
+                written = writer.submit(dump, b''.join(striptext))  # Strip complete, passing it to writer
+
+            # Side walls exist along the edges only, so instead of checking every pixel for being at the edge
+            # they are built in four separate passes along the edges, while the writer is busy with the last strip.
+            # Facet order in STL is arbitrary, so walls may go after the top and bottom.
+            # Wall triangle with its top corner at zero has no height and is skipped, same as zero pixels.
+
+            walls = []  # All four walls are collected here and then written at once
+
+            # left side
+            x1 = xMinus[0]
+            for y1, y5, cornerminus, cornerplus in zip(yMinus, yPlus, corner, corner[1:]):
+                z1 = zCorner[cornerminus[0]]
+                z7 = zCorner[cornerplus[0]]
+                if z1 != z0:
+                    walls.append(left % (x1, y1, z1, x1, y1, z0, x1, y5, z7))  # 1 - down1 - 7
+                if z7 != z0:
+                    walls.append(left % (x1, y1, z0, x1, y5, z0, x1, y5, z7))  # down1 - down7 - 7
+
+            # right side
+            x3 = xPlus[-1]
+            for y1, y5, cornerminus, cornerplus in zip(yMinus, yPlus, corner, corner[1:]):
+                z3 = zCorner[cornerminus[X]]
+                z5 = zCorner[cornerplus[X]]
+                if z5 != z0:
+                    walls.append(right % (x3, y5, z5, x3, y5, z0, x3, y1, z3))  # 5 - down5 - 3
+                if z3 != z0:
+                    walls.append(right % (x3, y1, z3, x3, y5, z0, x3, y1, z0))  # 3 - down5 - down3
+
+            # far side
+            y1 = yMinus[0]
+            for x1, x3, v1, v3 in zip(xMinus, xPlus, corner[0], corner[0][1:]):
+                z1 = zCorner[v1]
+                z3 = zCorner[v3]
+                if z3 != z0:
+                    walls.append(far % (x3, y1, z3, x3, y1, z0, x1, y1, z1))  # 3 - down - 1
+                if z1 != z0:
+                    walls.append(far % (x3, y1, z0, x1, y1, z0, x1, y1, z1))  # down - down - 1
+
+            # close side
+            y5 = yPlus[-1]
+            for x1, x3, v7, v5 in zip(xMinus, xPlus, corner[Y], corner[Y][1:]):
+                z7 = zCorner[v7]
+                z5 = zCorner[v5]
+                if z7 != z0:
+                    walls.append(close % (x1, y5, z7, x1, y5, z0, x3, y5, z5))  # 7 - down - 5
+                if z5 != z0:
+                    walls.append(close % (x1, y5, z0, x3, y5, z0, x3, y5, z5))  # down - down - 5
+
+            written.result()  # Last strip written
+            written = writer.submit(dump, b''.join(walls))  # Walls complete, passing them to writer
+
+            written.result()
+        finally:
+            writer.shutdown()  # Waits for the strip still being written, so output is never closed under the writer
+
+        dump(b'endsolid pryanik_nepechatnyj')  # closing object
+
+    # Output closed on leaving with block
 
     # --------------------------------------------------------------
     # Destroying dialog
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+
+'''
+IMG2STLB - Program for conversion of image heightfield to triangle mesh in binary STL format
+-----------------------------------------------------------------------------------------
+
+Created by: Ilya Razmanov (mailto:ilyarazmanov@gmail.com)  
+            aka Ilyich the Toad (mailto:amphisoft@gmail.com)  
+History:
+
+1.34.16.0   First production release. Same solid as img2stl, written as binary STL, no text formatting at all.  
+1.34.16.1   Zero height regions culled same as in img2stl.  
+
+-------------------
+Main site:
+https://dnyarri.github.io  
+
+Project mirrored at:  
+https://github.com/Dnyarri/img2mesh  
+https://gitflic.ru/project/dnyarri/img2mesh  
+
+'''
+
+__author__ = "Ilya Razmanov"
+__copyright__ = "(c) 2024-2026 Ilya Razmanov"
+__credits__ = "Ilya Razmanov"
+__license__ = "unlicense"
+__version__ = "1.34.16.1"
+__maintainer__ = "Ilya Razmanov"
+__email__ = "ilyarazmanov@gmail.com"
+__status__ = "Production"
+
+from array import array
+from pathlib import Path
+from struct import Struct
+from tkinter import Label, Tk, filedialog
+
+from png import Reader  # I/O with PyPNG from: https://gitlab.com/drj11/pypng
+
+# ACHTUNG! Starting a whole-program procedure!
+
+
+def img2stlb():
+    '''
+    Procedure for opening PNG heightfield and creating binary stereolithography .stl 3D mesh file from it.
+
+    '''
+
+    # --------------------------------------------------------------
+    # Creating dialog
+
+    iconpath = Path(__file__).resolve().parent / 'vaba.ico'
+    iconname = str(iconpath)
+    useicon = iconpath.exists()  # Check if icon file really exist. If False, it will not be used later.
+
+    sortir = Tk()
+    sortir.title('PNG to binary STL conversion')
+    if useicon:
+        sortir.iconbitmap(iconname)  # Replacement for simple sortir.iconbitmap('name.ico') - ugly but stable.
+    sortir.geometry('+200+100')
+    zanyato = Label(sortir, text='Allons-y!', font=('Courier', 14), padx=16, pady=10, justify='center')
+    zanyato.pack()
+    sortir.withdraw()
+
+    # Main dialog created and hidden
+    # --------------------------------------------------------------
+
+    # Open source image
+    sourcefilename = filedialog.askopenfilename(title='Open source PNG file', filetypes=[('PNG', '.png')], defaultextension=('PNG', '.png'))
+    # Source file name taken
+
+    if (sourcefilename == '') or (sourcefilename is None):
+        return None
+        # break if user press 'Cancel'
+
+    source = Reader(filename=sourcefilename)
+    # opening file with PyPNG
+
+    X, Y, pixels, info = source.asDirect()
+    # Opening image, iDAT comes to "pixels" generator, to be tuple'd later
+
+    Z = info['planes']  # Maximum channel number
+    imagedata = tuple(pixels)  # Building tuple from generator
+
+    if info['bitdepth'] == 8:
+        maxcolors = 255  # Maximal value for 8-bit channel
+    if info['bitdepth'] == 16:
+        maxcolors = 65535  # Maximal value for 16-bit channel
+
+    # source file opened, initial data received
+
+    # opening result file, first get name
+    resultfilename = filedialog.asksaveasfilename(
+        title='Save binary stereolithography STL file',
+        filetypes=[
+            ('3D print file', '*.stl'),
+            ('All Files', '*.*'),
+        ],
+        defaultextension=('3D object file', '.stl'),
+    )
+
+    if (resultfilename == '') or (resultfilename is None):
+        return None
+        # break if user press 'Cancel'
+
+    resultfile = open(resultfilename, 'wb', buffering=1 << 20)
+    # result file opened as binary with 1 Mb buffer
+
+    # Both files opened
+
+    # --------------------------------------------------------------
+    # Luminance map block, same as in img2stl:
+    #
+    # Whole image is converted to greyscale once, Y-mirrored to mimic Photoshop coordinate system,
+    # and kept as compact PyPNG rows or typed arrays.
+
+    if Z == 1:  # supposedly L, rows are taken as is
+        lum = list(reversed(imagedata))
+    elif Z == 2:  # supposedly LA, slice of PyPNG row is compact row as well
+        lum = [row[0::Z] for row in reversed(imagedata)]
+    else:  # supposedly RGB and RGBA
+        lum = [array('H', [int(0.2989 * r + 0.587 * g + 0.114 * b) for r, g, b in zip(row[0::Z], row[1::Z], row[2::Z])]) for row in reversed(imagedata)]
+
+    # corner[y][x] is the average of the four pixels around the node between pixels (x - 1, y - 1) and (x, y),
+    # with edge rows and columns repeated.
+
+    edged = [lum[0]] + lum + [lum[-1]]
+    corner = []
+    for upper, lower in zip(edged, edged[1:]):
+        pairsum = [a + b for a, b in zip(upper, lower)]
+        pairsum = [pairsum[0]] + pairsum + [pairsum[-1]]
+        corner.append(array('f', [0.25 * (a + b) for a, b in zip(pairsum, pairsum[1:])]))
+
+    del imagedata, edged  # Source image tuple is not needed anymore, maps above keep only rows they use
+
+    # end of Luminance map block
+    # --------------------------------------------------------------
+
+    # Global positioning and scaling to tweak, same as in img2stl.
+
+    xOffset = 1.0  # To be added BEFORE rescaling to compensate 0.5 X expansion
+    yOffset = 1.0  # To be added BEFORE rescaling to compensate 0.5 Y expansion
+    zOffset = 0.0  # To be added AFTER rescaling just in case there should be something to fix
+
+    yRescale = xRescale = 1.0 / float(max(X, Y))  # To fit object into 1,1,1 cube
+    zRescale = 1.0 / float(maxcolors)
+
+    # Vertex coordinates are calculated once for every column and row of corner nodes and pixel centers.
+
+    xNode = [xRescale * (i - 0.5 + xOffset) for i in range(X + 1)]
+    yNode = [yRescale * (j - 0.5 + yOffset) for j in range(Y + 1)]
+    xCenter = [xRescale * (x + xOffset) for x in range(X)]
+    yCenter = [yRescale * (y + yOffset) for y in range(Y)]
+
+    z0 = zOffset + 0.0  # Bottom height
+
+    # WRITING STL FILE, finally
+    # Based on specs at: https://paulbourke.net/dataformats/stl/
+    # 80 byte header, which must not begin with "solid", then number of facets, then facets.
+    # Every facet is 12 little endian float32: normal, then three vertices, followed by uint16 attribute, always 0.
+    # Solid is the same as in img2stl: four top and four bottom triangles for every pixel,
+    # and two triangles of side wall for every pixel along the edge, with zero height regions culled the same way.
+    # Number of facets is known only after culling, so it is written as 0 first and patched when all facets are written.
+
+    resultfile.write(f'Binary STL pryanik_nepechatnyj by img2stlb version: {__version__}'.encode().ljust(80, b' '))
+    resultfile.write(Struct('<I').pack(0))
+
+    facets = 0  # Number of facets written
+
+    # Every part of the solid is one or four facets, packed as one precompiled little endian struct.
+    # Normals are constant for every part, so they are kept as ready tuples.
+
+    pyramid = Struct('<' + '12fH' * 4)  # Four facets
+    facet = Struct('<12fH')  # Single facet
+
+    up = (0.0, 0.0, 1.0)
+    down = (0.0, 0.0, -1.0)
+
+    # Rows are processed in strips, each strip is collected and written at once,
+    # and progress is reported once per strip instead of once per row.
+
+    strip = max(1, 2048 // X)  # Rows per strip
+
+    for ystrip in range(0, Y, strip):
+
+        ystripend = min(ystrip + strip, Y)
+
+        message = f'Processing rows {str(ystrip)}-{str(ystripend - 1)} of {str(Y)}...'
+        sortir.deiconify()
+        zanyato.config(text=message)
+        sortir.update()
+        sortir.update_idletasks()
+
+        stripdata = []  # Whole strip of pyramids is collected here and then written at once
+
+        for y in range(ystrip, ystripend, 1):
+
+            # Pixel with all four corners at zero height lies right on the bottom, so its top and bottom are skipped,
+            # and rows lying on the bottom entirely are skipped at once, same as in img2stl.
+
+            if not (any(corner[y]) or any(corner[y + 1])):
+                continue
+
+            # Maps are already mirrored, so row y of image is row y of maps
+
+            y1 = yNode[y]  # y - 0.5
+            y9 = yCenter[y]
+            y5 = yNode[y + 1]  # y + 0.5
+
+            for v9, v1, v3, v5, v7, x1, x9, x3 in zip(lum[y], corner[y], corner[y][1:], corner[y + 1][1:], corner[y + 1], xNode, xCenter, xNode[1:]):
+                if not (v1 or v3 or v5 or v7):
+                    continue  # Pixel lies on the bottom, nothing to build
+
+                z1 = zOffset + zRescale * v1
+                z3 = zOffset + zRescale * v3
+                z5 = zOffset + zRescale * v5
+                z7 = zOffset + zRescale * v7
+                z9 = zOffset + zRescale * v9
+
+                if not v9:
+                    # Zero pixel next to non-zero ones, only triangles rising to non-zero corners are built
+                    for xa, ya, va, za, xb, yb, vb, zb in ((x1, y1, v1, z1, x3, y1, v3, z3), (x3, y1, v3, z3, x3, y5, v5, z5), (x3, y5, v5, z5, x1, y5, v7, z7), (x1, y5, v7, z7, x1, y1, v1, z1)):
+                        if va or vb:
+                            stripdata.append(facet.pack(*up, xa, ya, za, x9, y9, z9, xb, yb, zb, 0))
+                            stripdata.append(facet.pack(*down, xa, ya, z0, x9, y9, z0, xb, yb, z0, 0))
+                    continue
+
+                # top part
+                stripdata.append(
+                    pyramid.pack(
+                        *up, x1, y1, z1, x9, y9, z9, x3, y1, z3, 0,  # triangle 2, 1 - 9 - 3
+                        *up, x3, y1, z3, x9, y9, z9, x3, y5, z5, 0,  # triangle 4, 3 - 9 - 5
+                        *up, x3, y5, z5, x9, y9, z9, x1, y5, z7, 0,  # triangle 6, 5 - 9 - 7
+                        *up, x1, y5, z7, x9, y9, z9, x1, y1, z1, 0,  # triangle 8, 7 - 9 - 1
+                    )
+                )
+
+                # bottom part
+                stripdata.append(
+                    pyramid.pack(
+                        *down, x1, y1, z0, x9, y9, z0, x3, y1, z0, 0,  # triangle 2, 1 - 9 - 3
+                        *down, x3, y1, z0, x9, y9, z0, x3, y5, z0, 0,  # triangle 4, 3 - 9 - 5
+                        *down, x3, y5, z0, x9, y9, z0, x1, y5, z0, 0,  # triangle 6, 5 - 9 - 7
+                        *down, x1, y5, z0, x9, y9, z0, x1, y1, z0, 0,  # triangle 8, 7 - 9 - 1
+                    )
+                )
+
+        stripdata = b''.join(stripdata)
+        facets += len(stripdata) // facet.size
+        resultfile.write(stripdata)
+
+    # Side walls are built for the whole edge at once, after the top and bottom, since facet order in STL is arbitrary.
+    # Wall triangle with its top corner at zero has no height and is skipped, same as zero pixels.
+
+    walls = []
+
+    left = (-1.0, 0.0, 0.0)
+    x1 = xNode[0]
+    for y1, y5, cornerminus, cornerplus in zip(yNode, yNode[1:], corner, corner[1:]):
+        z1 = zOffset + zRescale * cornerminus[0]
+        z7 = zOffset + zRescale * cornerplus[0]
+        if cornerminus[0]:
+            walls.append(facet.pack(*left, x1, y1, z1, x1, y1, z0, x1, y5, z7, 0))  # 1 - down1 - 7
+        if cornerplus[0]:
+            walls.append(facet.pack(*left, x1, y1, z0, x1, y5, z0, x1, y5, z7, 0))  # down1 - down7 - 7
+
+    right = (1.0, 0.0, 0.0)
+    x3 = xNode[X]
+    for y1, y5, cornerminus, cornerplus in zip(yNode, yNode[1:], corner, corner[1:]):
+        z3 = zOffset + zRescale * cornerminus[X]
+        z5 = zOffset + zRescale * cornerplus[X]
+        if cornerplus[X]:
+            walls.append(facet.pack(*right, x3, y5, z5, x3, y5, z0, x3, y1, z3, 0))  # 5 - down5 - 3
+        if cornerminus[X]:
+            walls.append(facet.pack(*right, x3, y1, z3, x3, y5, z0, x3, y1, z0, 0))  # 3 - down5 - down3
+
+    far = (0.0, -1.0, 0.0)
+    y1 = yNode[0]
+    for x1, x3, v1, v3 in zip(xNode, xNode[1:], corner[0], corner[0][1:]):
+        z1 = zOffset + zRescale * v1
+        z3 = zOffset + zRescale * v3
+        if v3:
+            walls.append(facet.pack(*far, x3, y1, z3, x3, y1, z0, x1, y1, z1, 0))  # 3 - down - 1
+        if v1:
+            walls.append(facet.pack(*far, x3, y1, z0, x1, y1, z0, x1, y1, z1, 0))  # down - down - 1
+
+    close = (0.0, 1.0, 0.0)
+    y5 = yNode[Y]
+    for x1, x3, v7, v5 in zip(xNode, xNode[1:], corner[Y], corner[Y][1:]):
+        z7 = zOffset + zRescale * v7
+        z5 = zOffset + zRescale * v5
+        if v7:
+            walls.append(facet.pack(*close, x1, y5, z7, x1, y5, z0, x3, y5, z5, 0))  # 7 - down - 5
+        if v5:
+            walls.append(facet.pack(*close, x1, y5, z0, x3, y5, z0, x3, y5, z5, 0))  # down - down - 5
+
+    resultfile.write(b''.join(walls))
+    facets += len(walls)
+
+    # All facets written, patching their number after the header
+
+    resultfile.seek(80)
+    resultfile.write(Struct('<I').pack(facets))
+
+    # Close output
+    resultfile.close()
+
+    # --------------------------------------------------------------
+    # Destroying dialog
+
+    sortir.destroy()
+    sortir.mainloop()
+
+    # Dialog destroyed and closed
+    # --------------------------------------------------------------
+
+
+# Procedure ended, the program begins
+if __name__ == "__main__":
+    img2stlb()